@@ -0,0 +1,190 @@
+from urllib.parse import urlencode, urlparse, parse_qsl
+import json
+import os
+import sqlite3
+import statistics
+import threading
+import time
+
+
+DEFAULT_BASELINE_TOP_N = 10
+DEFAULT_BASELINE_COUNT_TOLERANCE = 0.01
+DEFAULT_BASELINE_LATENCY_TOLERANCE = 0.5
+DEFAULT_BASELINE_LATENCY_MIN_MS = 20
+
+# Search results (totalItems, the ids of the first TOP_N items and latency)
+# are stored per query in this SQLite file, and compared to the previous
+# run that made the same query.
+BASELINE_DB = os.environ.get('LXLTESTING_BASELINE_DB')
+BASELINE_TOP_N = int(os.environ.get('LXLTESTING_BASELINE_TOP_N',
+                                    DEFAULT_BASELINE_TOP_N))
+# Relative change of totalItems that is flagged as drift
+BASELINE_COUNT_TOLERANCE = float(os.environ.get(
+    'LXLTESTING_BASELINE_COUNT_TOLERANCE', DEFAULT_BASELINE_COUNT_TOLERANCE))
+# Relative increase of the median latency that is flagged as a regression,
+# if it is also more than BASELINE_LATENCY_MIN_MS
+BASELINE_LATENCY_TOLERANCE = float(os.environ.get(
+    'LXLTESTING_BASELINE_LATENCY_TOLERANCE', DEFAULT_BASELINE_LATENCY_TOLERANCE))
+BASELINE_LATENCY_MIN_MS = float(os.environ.get(
+    'LXLTESTING_BASELINE_LATENCY_MIN_MS', DEFAULT_BASELINE_LATENCY_MIN_MS))
+
+SCHEMA = [
+    '''CREATE TABLE IF NOT EXISTS samples (
+           run TEXT NOT NULL,
+           time REAL NOT NULL,
+           query TEXT NOT NULL,
+           total_items INTEGER,
+           top_ids TEXT NOT NULL,
+           latency REAL NOT NULL)''',
+    'CREATE INDEX IF NOT EXISTS samples_query ON samples (query, time)',
+]
+
+
+class BaselineStore:
+    """Stores one sample per search response, for comparison across runs."""
+
+    def __init__(self):
+        self.run = None
+        self._connection = None
+        self._lock = threading.Lock()
+
+    def open(self, path, run):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        # Shared by the worker threads of e.g. run_concurrently
+        self._connection = sqlite3.connect(path, timeout=30,
+                                           check_same_thread=False)
+        # Allows concurrent test processes to write to the same file
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        for statement in SCHEMA:
+            self._connection.execute(statement)
+        self._connection.commit()
+        self.run = run
+
+    def close(self):
+        if self._connection:
+            self._connection.close()
+            self._connection = None
+
+    @property
+    def enabled(self):
+        return self._connection is not None
+
+    def record(self, query, total_items, top_ids, latency):
+        with self._lock:
+            self._connection.execute(
+                'INSERT INTO samples VALUES (?, ?, ?, ?, ?, ?)',
+                (self.run, time.time(), query, total_items,
+                 json.dumps(top_ids), latency))
+            self._connection.commit()
+
+    def comparisons(self):
+        """Compares each query of this run to its previous run.
+
+        Returns dicts with the query, both runs' last totalItems and top
+        ids and median latencies, and a list of flags. Queries not made
+        before have no previous values and no flags.
+        """
+        with self._lock:
+            queries = [row[0] for row in self._connection.execute(
+                'SELECT DISTINCT query FROM samples WHERE run = ? '
+                'ORDER BY query', (self.run,))]
+            comparisons = []
+            for query in queries:
+                current = self._run_summary(query, self.run)
+                previous_run = self._connection.execute(
+                    'SELECT run FROM samples WHERE query = ? AND run != ? '
+                    'ORDER BY time DESC LIMIT 1', (query, self.run)).fetchone()
+                previous = previous_run and self._run_summary(query,
+                                                              previous_run[0])
+                comparisons.append(_compare(query, current, previous))
+        return comparisons
+
+    def _run_summary(self, query, run):
+        rows = self._connection.execute(
+            'SELECT total_items, top_ids, latency FROM samples '
+            'WHERE query = ? AND run = ? ORDER BY time', (query, run)).fetchall()
+        total_items, top_ids, _ = rows[-1]
+        return {'run': run,
+                'total_items': total_items,
+                'top_ids': json.loads(top_ids),
+                'latency': statistics.median(row[2] for row in rows)}
+
+
+store = BaselineStore()
+
+
+def baseline_hook(response, *args, **kwargs):
+    if not store.enabled or kwargs.get('stream'):
+        return
+    # Replayed responses have no elapsed time and say nothing about the
+    # server
+    if (response.request.method != 'GET' or response.status_code != 200
+            or not response.elapsed
+            or not urlparse(response.url).path.endswith('/find')):
+        return
+    try:
+        body = response.json()
+    except ValueError:
+        return
+    top_ids = [item.get('@id') for item in body.get('items', [])[:BASELINE_TOP_N]]
+    store.record(query_key(response.url), body.get('totalItems'), top_ids,
+                 response.elapsed.total_seconds())
+
+
+def query_key(url):
+    # Path and query with the parameters sorted, so that parameter order
+    # does not matter
+    parsed = urlparse(url)
+    params = sorted(parse_qsl(parsed.query, keep_blank_values=True))
+    return parsed.path + ('?' + urlencode(params) if params else '')
+
+
+def _compare(query, current, previous):
+    comparison = {'query': query, 'current': current, 'previous': previous,
+                  'flags': []}
+    if not previous:
+        return comparison
+    flags = comparison['flags']
+
+    before, after = previous['total_items'], current['total_items']
+    if before is None or after is None:
+        if before != after:
+            flags.append('totalItems')
+    elif abs(after - before) > BASELINE_COUNT_TOLERANCE * before:
+        flags.append('totalItems')
+
+    if current['top_ids'] != previous['top_ids']:
+        flags.append('top ids')
+
+    slower = current['latency'] - previous['latency']
+    if (slower > previous['latency'] * BASELINE_LATENCY_TOLERANCE
+            and slower * 1000 > BASELINE_LATENCY_MIN_MS):
+        flags.append('latency')
+    return comparison
+
+
+def comparison_lines(flagged_only=True):
+    # Summary, and a table of the drifted (or all compared) queries
+    comparisons = store.comparisons()
+    compared = [c for c in comparisons if c['previous']]
+    flagged = [c for c in compared if c['flags']]
+    lines = ['{} queries, {} with a previous run, {} drifted'.format(
+        len(comparisons), len(compared), len(flagged))]
+    shown = flagged if flagged_only else compared
+    if not shown:
+        return lines
+
+    lines.append('{:<60} {:>10} {:>10} {:>6} {:>9} {:>9}  {}'.format(
+        'query', 'was', 'total', 'top', 'was ms', 'p50 ms', 'drift'))
+    for c in shown:
+        current, previous = c['current'], c['previous']
+        same_top = len(set(current['top_ids']) & set(previous['top_ids']))
+        lines.append('{:<60} {:>10} {:>10} {:>6} {:>9.1f} {:>9.1f}  {}'.format(
+            c['query'][-60:], str(previous['total_items']),
+            str(current['total_items']),
+            '{}/{}'.format(same_top, len(previous['top_ids'])),
+            previous['latency'] * 1000, current['latency'] * 1000,
+            ', '.join(c['flags'])))
+    return lines
@@ -0,0 +1,385 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse, parse_qsl
+import contextlib
+import json
+import os
+import re
+import threading
+import time
+import tracemalloc
+
+
+DEFAULT_BENCH_ITERATIONS = 10
+DEFAULT_TIMINGS_DIR = '.timings'
+DEFAULT_SLOWEST_ENDPOINTS = 10
+DEFAULT_LATENCY_REPEAT = 10
+DEFAULT_LATENCY_WARMUP = 1
+
+# Multiplies all latency budgets, e.g. 2 for a slower environment. The
+# default 0 disables the latency checks, marked tests then run once as usual.
+LATENCY_SCALE = float(os.environ.get('LXLTESTING_LATENCY_SCALE', 0))
+BUDGET_PATTERN = re.compile(r'^p([0-9]+(?:\.[0-9]+)?)_ms$')
+
+# XL short ids (e.g. wf77dvw71q66jh4) and legacy numeric ids are replaced
+# by placeholders so that requests group by endpoint.
+SHORT_ID_PATTERN = re.compile(r'^(?=.*[0-9])[0-9a-z]{14,16}$')
+NUMBER_PATTERN = re.compile(r'^[0-9]+$')
+
+
+class Recorder:
+    """Collects one sample per HTTP response.
+
+    Samples are kept in memory for the summaries and, if a file has been
+    opened, also appended to it as JSON lines as they arrive.
+    """
+
+    def __init__(self):
+        self.enabled = True
+        self.samples = []
+        self.current_test = None
+        self._file = None
+        self._lock = threading.Lock()
+
+    def open(self, path):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, 'a')
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def record(self, method, endpoint, status, elapsed, nbytes=None):
+        sample = {'time': time.time(),
+                  'test': self.current_test,
+                  'method': method,
+                  'endpoint': endpoint,
+                  'status': status,
+                  'bytes': nbytes,
+                  'elapsed': elapsed}
+        with self._lock:
+            self.samples.append(sample)
+            if self._file:
+                self._file.write(json.dumps(sample) + '\n')
+
+    def by_endpoint(self):
+        endpoints = {}
+        with self._lock:
+            for sample in self.samples:
+                key = (sample['method'], sample['endpoint'])
+                endpoints.setdefault(key, []).append(sample)
+        return endpoints
+
+
+recorder = Recorder()
+
+# One entry per benchmarked test
+scenarios = []
+
+# One entry per test with a latency budget
+latency_checks = []
+
+# Tables added by tests, printed in the terminal summary
+reports = []
+
+
+def instrument(session):
+    session.hooks['response'].append(timing_hook)
+    return session
+
+
+def timing_hook(response, *args, **kwargs):
+    if not recorder.enabled:
+        return
+    elapsed = response.elapsed.total_seconds()
+    if kwargs.get('stream'):
+        # Don't consume streamed bodies, only time to headers is known
+        nbytes = response.headers.get('Content-Length')
+        nbytes = int(nbytes) if nbytes else None
+    else:
+        # The body would be read right after the hooks anyway, include the
+        # transfer in the elapsed time
+        start = time.monotonic()
+        nbytes = len(response.content)
+        elapsed += time.monotonic() - start
+    recorder.record(response.request.method,
+                    url_template(response.url),
+                    response.status_code,
+                    elapsed,
+                    nbytes)
+
+
+def url_template(url):
+    parsed = urlparse(url)
+    segments = []
+    for segment in parsed.path.split('/'):
+        if SHORT_ID_PATTERN.match(segment):
+            segment = '{id}'
+        elif NUMBER_PATTERN.match(segment):
+            segment = '{n}'
+        segments.append(segment)
+    template = '{}://{}{}'.format(parsed.scheme, parsed.netloc,
+                                  '/'.join(segments))
+    params = sorted({key for key, _ in parse_qsl(parsed.query,
+                                                 keep_blank_values=True)})
+    if params:
+        template += '{?' + ','.join(params) + '}'
+    return template
+
+
+def percentile(values, p):
+    # Linear interpolation between closest ranks
+    if not values:
+        return None
+    values = sorted(values)
+    k = (len(values) - 1) * p / 100.0
+    lower = int(k)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (k - lower)
+
+
+def run_scenario(name, fn, iterations=None, duration=None, concurrency=1):
+    """Calls fn repeatedly from concurrency threads and records the run.
+
+    Runs for the given number of iterations, or until duration seconds
+    have passed, whichever comes first. The first exception stops all
+    workers and is re-raised.
+    """
+    if iterations is None and duration is None:
+        iterations = DEFAULT_BENCH_ITERATIONS
+    deadline = time.monotonic() + duration if duration else None
+    lock = threading.Lock()
+    started = [0]
+    timings = []
+    errors = []
+
+    def next_iteration():
+        with lock:
+            if errors:
+                return False
+            if iterations is not None and started[0] >= iterations:
+                return False
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            started[0] += 1
+            return True
+
+    def worker():
+        while next_iteration():
+            start = time.monotonic()
+            try:
+                fn()
+            except BaseException as e:
+                with lock:
+                    errors.append(e)
+                return
+            with lock:
+                timings.append(time.monotonic() - start)
+
+    start = time.monotonic()
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for _ in range(concurrency):
+            executor.submit(worker)
+    wall = time.monotonic() - start
+
+    scenarios.append({'name': name,
+                      'concurrency': concurrency,
+                      'iterations': len(timings),
+                      'wall': wall,
+                      'timings': timings})
+    if errors:
+        raise errors[0]
+
+
+def check_latency(name, fn, *, repeat=DEFAULT_LATENCY_REPEAT,
+                  warmup=DEFAULT_LATENCY_WARMUP, **budgets):
+    """Calls fn repeat times and checks the latency percentiles.
+
+    Budgets are given as p<N>_ms=<milliseconds>, e.g. p95_ms=300, and are
+    scaled by LATENCY_SCALE. Raises AssertionError if any is exceeded.
+    """
+    limits = {}
+    for key, budget_ms in budgets.items():
+        match = BUDGET_PATTERN.match(key)
+        if not match:
+            raise ValueError('unknown latency budget: {}'.format(key))
+        limits[float(match.group(1))] = budget_ms * LATENCY_SCALE / 1000.0
+
+    for _ in range(warmup):
+        fn()
+    timings = []
+    for _ in range(repeat):
+        start = time.monotonic()
+        fn()
+        timings.append(time.monotonic() - start)
+
+    observed = {p: percentile(timings, p) for p in limits}
+    latency_checks.append({'name': name,
+                           'limits': limits,
+                           'observed': observed})
+    exceeded = ['p{:g} {} ms > {} ms'.format(p, _ms(observed[p]), _ms(limit))
+                for p, limit in sorted(limits.items()) if observed[p] > limit]
+    assert not exceeded, 'latency budget exceeded over {} runs: {}'.format(
+        repeat, ', '.join(exceeded))
+
+
+def sample_responses(send, repeat=DEFAULT_LATENCY_REPEAT,
+                     warmup=DEFAULT_LATENCY_WARMUP):
+    """Calls send(), which makes a request, warmup + repeat times.
+
+    Returns the server latencies (time to response headers, in seconds) and
+    body sizes of the repeat responses. Asserts that they were all 2xx.
+    """
+    latencies = []
+    sizes = []
+    for i in range(warmup + repeat):
+        response = send()
+        assert 200 <= response.status_code < 300, \
+            '{} {}'.format(response.url, response.status_code)
+        if i >= warmup:
+            latencies.append(response.elapsed.total_seconds())
+            sizes.append(len(response.content))
+    return latencies, sizes
+
+
+@contextlib.contextmanager
+def traced_memory():
+    """Traces Python allocations made in the block.
+
+    Yields a dict that gets the peak traced memory in bytes, over what was
+    allocated before the block, as 'peak' on exit.
+    """
+    memory = {}
+    tracing = tracemalloc.is_tracing()
+    if not tracing:
+        tracemalloc.start()
+    tracemalloc.reset_peak()
+    start, _ = tracemalloc.get_traced_memory()
+    try:
+        yield memory
+    finally:
+        _, peak = tracemalloc.get_traced_memory()
+        memory['peak'] = peak - start
+        if not tracing:
+            tracemalloc.stop()
+
+
+def latency_lines():
+    lines = ['{:<60} {:>9} {:>12} {:>12}'.format(
+        'test', 'pct', 'observed ms', 'budget ms')]
+    for check in latency_checks:
+        for p, limit in sorted(check['limits'].items()):
+            observed = check['observed'][p]
+            lines.append('{:<60} {:>9} {:>12} {:>12}{}'.format(
+                check['name'][-60:], 'p{:g}'.format(p), _ms(observed),
+                _ms(limit), '  EXCEEDED' if observed > limit else ''))
+    return lines
+
+
+def add_report(title, columns, rows):
+    """Adds a table to the terminal summary.
+
+    Floats are printed with two decimals, None as '-'.
+    """
+    reports.append({'title': title,
+                    'columns': list(columns),
+                    'rows': [list(row) for row in rows]})
+
+
+def report_row(title, columns, row):
+    # Appends a row to the report with the given title, creating it if needed
+    for report in reports:
+        if report['title'] == title:
+            report['rows'].append(list(row))
+            return
+    add_report(title, columns, [row])
+
+
+def report_lines(report):
+    def cell(value):
+        if value is None:
+            return '-'
+        if isinstance(value, float):
+            return '{:.2f}'.format(value)
+        return str(value)
+
+    rows = [report['columns']] + [[cell(v) for v in row] for row in report['rows']]
+    widths = [max(len(row[i]) for row in rows) for i in range(len(rows[0]))]
+    return ['  '.join([row[0].ljust(widths[0])] +
+                      [v.rjust(w) for v, w in zip(row[1:], widths[1:])])
+            for row in rows]
+
+
+def latency_stats(timings):
+    # (count, p50 ms, p95 ms, max ms) for a list of durations in seconds
+    return (len(timings),
+            *[percentile(timings, p) * 1000 if timings else None
+              for p in (50, 95, 100)])
+
+
+def summary_lines():
+    lines = []
+    wall = sum(scenario['wall'] for scenario in scenarios)
+
+    lines.append('{:<60} {:>6} {:>9} {:>9} {:>9} {:>9}'.format(
+        'scenario', 'iter', 'iter/s', 'p50 ms', 'p95 ms', 'p99 ms'))
+    for scenario in scenarios:
+        timings = scenario['timings']
+        lines.append('{:<60} {:>6} {:>9.2f} {:>9} {:>9} {:>9}'.format(
+            scenario['name'][-60:], len(timings),
+            len(timings) / scenario['wall'] if scenario['wall'] else 0,
+            *[_ms(percentile(timings, p)) for p in (50, 95, 99)]))
+
+    lines.append('')
+    lines.append('{:<60} {:>6} {:>9} {:>9} {:>9} {:>9} {:>6}'.format(
+        'endpoint', 'count', 'req/s', 'p50 ms', 'p95 ms', 'p99 ms', '!2xx'))
+    for (method, endpoint), samples in sorted(recorder.by_endpoint().items()):
+        elapsed = [sample['elapsed'] for sample in samples]
+        failed = sum(1 for sample in samples if not 200 <= sample['status'] < 400)
+        lines.append('{:<60} {:>6} {:>9.2f} {:>9} {:>9} {:>9} {:>6}'.format(
+            (method + ' ' + endpoint)[-60:], len(samples),
+            len(samples) / wall if wall else 0,
+            *[_ms(percentile(elapsed, p)) for p in (50, 95, 99)],
+            failed))
+    return lines
+
+
+def slowest_endpoint_lines(top=DEFAULT_SLOWEST_ENDPOINTS):
+    rows = []
+    for (method, endpoint), samples in recorder.by_endpoint().items():
+        elapsed = [sample['elapsed'] for sample in samples]
+        sizes = [sample['bytes'] for sample in samples
+                 if sample['bytes'] is not None]
+        rows.append((percentile(elapsed, 95), method + ' ' + endpoint,
+                     len(samples), percentile(elapsed, 50), max(elapsed),
+                     sum(elapsed), sum(sizes) // len(sizes) if sizes else None))
+    rows.sort(key=lambda row: row[0], reverse=True)
+
+    lines = ['{:<60} {:>6} {:>9} {:>9} {:>9} {:>9} {:>10}'.format(
+        'endpoint', 'count', 'p50 ms', 'p95 ms', 'max ms', 'total s',
+        'avg bytes')]
+    for p95, endpoint, count, p50, slowest, total, avg_bytes in rows[:top]:
+        lines.append('{:<60} {:>6} {:>9} {:>9} {:>9} {:>9.1f} {:>10}'.format(
+            endpoint[-60:], count, _ms(p50), _ms(p95), _ms(slowest), total,
+            '-' if avg_bytes is None else avg_bytes))
+    return lines
+
+
+def indexing_lag_lines(lags, top=DEFAULT_SLOWEST_ENDPOINTS):
+    # Summary of the waits for the index (see conf_util.indexing_lags), and
+    # the slowest of them
+    seconds = [lag['lag'] for lag in lags]
+    lines = ['{} waits, p50 {} ms, p95 {} ms, max {} ms, {:.1f} polls per wait'.format(
+        len(lags), _ms(percentile(seconds, 50)), _ms(percentile(seconds, 95)),
+        _ms(max(seconds)), sum(lag['polls'] for lag in lags) / len(lags))]
+    lines.append('{:>9} {:>6}  {}'.format('lag ms', 'polls', 'ids'))
+    for lag in sorted(lags, key=lambda lag: lag['lag'], reverse=True)[:top]:
+        lines.append('{:>9} {:>6}  {}'.format(
+            _ms(lag['lag']), lag['polls'], ' '.join(lag['ids'])[:100]))
+    return lines
+
+
+def _ms(seconds):
+    return '-' if seconds is None else '{:.1f}'.format(seconds * 1000)
@@ -0,0 +1,160 @@
+import baseline_util
+import bench_util
+import fake_xl
+import http_util
+import os
+import pytest
+import sys
+import time
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('bench', 'benchmark mode')
+    group.addoption('--bench', action='store_true',
+                    help='run each selected test repeatedly as a load test '
+                         'and report throughput and latency per endpoint, '
+                         'and run the tests marked bench')
+    group.addoption('--bench-iterations', type=int, default=None,
+                    help='iterations per test (default: {}, or unlimited '
+                         'with --bench-duration)'.format(
+                             bench_util.DEFAULT_BENCH_ITERATIONS))
+    group.addoption('--bench-duration', type=float, default=None,
+                    help='seconds to run each test for')
+    group.addoption('--bench-concurrency', type=int, default=1,
+                    help='number of concurrent runs of each test')
+
+    group = parser.getgroup('fake-xl', 'local stand-in for XL')
+    group.addoption('--fake-xl', action='store_true',
+                    help='run against an in-process fake of the XL REST, '
+                         'search, Elasticsearch and oauth endpoints instead '
+                         'of the LXLTESTING_* URLs')
+
+    group = parser.getgroup('timings', 'request timings')
+    group.addoption('--timings-file', default=None,
+                    help='JSON lines file to write one record per HTTP '
+                         'request to (default: {}/<time>-<pid>.jsonl)'.format(
+                             bench_util.DEFAULT_TIMINGS_DIR))
+    group.addoption('--timings-top', type=int,
+                    default=bench_util.DEFAULT_SLOWEST_ENDPOINTS,
+                    help='number of slowest endpoints to list in the '
+                         'summary, 0 to disable')
+    group.addoption('--connection-stats', action='store_true',
+                    help='report connections opened and reused per host')
+
+
+def pytest_configure(config):
+    if config.getoption('fake_xl'):
+        # Must happen before conf_util reads the environment
+        server, environment = fake_xl.start()
+        os.environ.update(environment)
+        config.fake_xl_server = server
+
+    timings_file = config.getoption('timings_file')
+    if not timings_file:
+        timings_file = os.path.join(
+            str(config.rootpath), bench_util.DEFAULT_TIMINGS_DIR,
+            '{}-{}.jsonl'.format(time.strftime('%Y%m%dT%H%M%S'), os.getpid()))
+    bench_util.recorder.open(timings_file)
+
+    if baseline_util.BASELINE_DB:
+        run = (os.environ.get('PYTEST_XDIST_TESTRUNUID')
+               or '{}-{}'.format(time.strftime('%Y%m%dT%H%M%S'), os.getpid()))
+        baseline_util.store.open(baseline_util.BASELINE_DB, run)
+
+
+def pytest_unconfigure(config):
+    bench_util.recorder.close()
+    baseline_util.store.close()
+    server = getattr(config, 'fake_xl_server', None)
+    if server:
+        server.shutdown()
+
+
+@pytest.hookimpl(hookwrapper=True)
+def pytest_runtest_protocol(item, nextitem):
+    bench_util.recorder.current_test = item.nodeid
+    yield
+    bench_util.recorder.current_test = None
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption('bench'):
+        return
+    skip = pytest.mark.skip(reason='benchmark, run with --bench')
+    for item in items:
+        if item.get_closest_marker('bench'):
+            item.add_marker(skip)
+
+
+@pytest.hookimpl(tryfirst=True)
+def pytest_pyfunc_call(pyfuncitem):
+    config = pyfuncitem.config
+    if pyfuncitem.get_closest_marker('bench'):
+        # Benchmarks measure themselves, run them once
+        return None
+    latency = pyfuncitem.get_closest_marker('latency')
+    if latency and latency.args:
+        raise ValueError('latency marker takes keyword arguments only, '
+                         'e.g. latency(p95_ms=300)')
+    if (latency and http_util.REPLAY_MODE == 'replay'
+            and pyfuncitem.get_closest_marker('replayable')):
+        # Replayed responses say nothing about server latency
+        latency = None
+    bench = config.getoption('bench')
+    if not bench and not (latency and bench_util.LATENCY_SCALE):
+        return None
+
+    funcargs = pyfuncitem.funcargs
+    testargs = {arg: funcargs[arg] for arg in pyfuncitem._fixtureinfo.argnames}
+    if not bench:
+        bench_util.check_latency(pyfuncitem.nodeid,
+                                 lambda: pyfuncitem.obj(**testargs),
+                                 **latency.kwargs)
+        return True
+
+    bench_util.run_scenario(pyfuncitem.nodeid,
+                            lambda: pyfuncitem.obj(**testargs),
+                            iterations=config.getoption('bench_iterations'),
+                            duration=config.getoption('bench_duration'),
+                            concurrency=config.getoption('bench_concurrency'))
+    return True
+
+
+def pytest_terminal_summary(terminalreporter, exitstatus, config):
+    top = config.getoption('timings_top')
+    if top and bench_util.recorder.samples:
+        terminalreporter.section('slowest endpoints')
+        for line in bench_util.slowest_endpoint_lines(top):
+            terminalreporter.write_line(line)
+
+    # Not imported at the top, conf_util reads the environment --fake-xl sets
+    conf_util = sys.modules.get('conf_util')
+    if top and conf_util and conf_util.indexing_lags:
+        terminalreporter.section('indexing lag')
+        for line in bench_util.indexing_lag_lines(conf_util.indexing_lags, top):
+            terminalreporter.write_line(line)
+
+    if baseline_util.store.enabled:
+        terminalreporter.section('search baseline')
+        for line in baseline_util.comparison_lines():
+            terminalreporter.write_line(line)
+
+    if config.getoption('connection_stats'):
+        terminalreporter.section('connection reuse')
+        for line in http_util.connection_stats_lines():
+            terminalreporter.write_line(line)
+
+    for report in bench_util.reports:
+        terminalreporter.section(report['title'])
+        for line in bench_util.report_lines(report):
+            terminalreporter.write_line(line)
+
+    if bench_util.latency_checks:
+        terminalreporter.section('latency budgets')
+        for line in bench_util.latency_lines():
+            terminalreporter.write_line(line)
+
+    if config.getoption('bench') and bench_util.scenarios:
+        terminalreporter.section('benchmark')
+        for line in bench_util.summary_lines():
+            terminalreporter.write_line(line)
@@ -0,0 +1,467 @@
+"""Local stand-in for the parts of LibrisXL that the tests use.
+
+Implements, in memory:
+
+- the REST API: POST /data, GET/PUT/DELETE of records with ETag/If-Match,
+  versions, 410 after delete and redirects from sameAs ids
+- /find over the records visible in the index, with exact matching on
+  dotted property paths, `not-` prefixes, free text `q`, paging and a
+  `@type` slice
+- the Elasticsearch endpoints the tests poll: /_es/_refresh and an ids
+  query on /_es/_search (records only become searchable on refresh, and
+  get a new _seq_no when they, or records linking to them, change)
+- the oauth authorize, login and confirm forms scraped by the session
+  fixture
+
+Start it with `pytest --fake-xl`, or run `python tests/fake_xl.py` and
+export the printed LXLTESTING_* variables.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs, parse_qsl, urlencode
+import argparse
+import html
+import json
+import random
+import string
+import threading
+import time
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 0
+DEFAULT_LIMIT = 20
+DEFAULT_TOKEN_LIFETIME = 3600
+OAUTH_CLIENT_ID = 'fake-xl'
+USERNAME = 'test'
+PASSWORD = 'test'
+LEGACY_BASE = 'http://libris.kb.se'
+TMP_ID = '_:TMPID'
+ID_CHARS = string.ascii_lowercase + string.digits
+JSON_TYPES = {'application/ld+json': 'jsonld', 'application/json': 'json'}
+
+
+class Record:
+    def __init__(self, short_id, data):
+        self.short_id = short_id
+        self.versions = [data]
+        self.deleted = False
+        self.seq_no = 0
+
+    @property
+    def data(self):
+        return self.versions[-1]
+
+    @property
+    def etag(self):
+        return '"{}"'.format(len(self.versions) - 1)
+
+    def graph(self, version=-1):
+        return self.versions[version]['@graph']
+
+
+class FakeXL:
+    def __init__(self, base_url='', token_lifetime=DEFAULT_TOKEN_LIFETIME):
+        self.base_url = base_url
+        self.token_lifetime = token_lifetime
+        self.records = {}
+        # _seq_no of the visible records, by short id
+        self.visible = {}
+        self.seq_no = 0
+        self.tokens = {}
+        self.lock = threading.RLock()
+
+    # Records
+
+    def new_id(self):
+        while True:
+            short_id = ''.join(random.choice(ID_CHARS) for _ in range(15))
+            if short_id not in self.records and any(c.isdigit() for c in short_id):
+                return short_id
+
+    def create(self, data):
+        with self.lock:
+            short_id = self.new_id()
+            uri = self.base_url + '/' + short_id
+            data = _replace_strings(data, TMP_ID, uri)
+            self.records[short_id] = Record(short_id, data)
+            self.changed(self.records[short_id])
+            return uri
+
+    def resolve(self, path):
+        # Returns (record, redirect) for a request path
+        with self.lock:
+            short_id = path.strip('/').split('/')[0]
+            if short_id in self.records:
+                return self.records[short_id], None
+            for candidate in (path.lstrip('/'), LEGACY_BASE + path):
+                for record in self.records.values():
+                    record_node, thing = record.graph()[0], record.graph()[1]
+                    if _has_same_as(record_node, candidate):
+                        return None, record_node['@id']
+                    if _has_same_as(thing, candidate):
+                        return None, thing['@id']
+            return None, None
+
+    def dependants(self, record):
+        thing_id = record.graph()[1]['@id']
+        return [other for other in self.records.values()
+                if not other.deleted and other is not record
+                and _references(other.graph(), thing_id)]
+
+    def changed(self, record):
+        # Like XL, reindexes the record and the records it links to (e.g.
+        # the bib of a holding, with the holding in @reverse)
+        with self.lock:
+            graph = record.graph()
+            for other in self.records.values():
+                if other is record or _references(graph, other.graph()[1]['@id']):
+                    self.seq_no += 1
+                    other.seq_no = self.seq_no
+
+    def refresh(self):
+        with self.lock:
+            self.visible = {short_id: record.seq_no
+                            for short_id, record in self.records.items()
+                            if not record.deleted}
+
+    def indexed(self):
+        with self.lock:
+            return [self.records[short_id] for short_id in sorted(self.visible)]
+
+    # Search
+
+    def find(self, params):
+        query = dict(parse_qsl(params, keep_blank_values=True))
+        conditions = parse_qs(params, keep_blank_values=True)
+        limit = int(query.get('_limit', DEFAULT_LIMIT))
+        offset = int(query.get('_offset', 0))
+        text = query.get('q', query.get('_q', '*')).strip()
+
+        things = [record.graph()[1] for record in self.indexed()]
+        if text and text != '*':
+            words = text.lower().replace('+', ' ').split()
+            things = [thing for thing in things
+                      if all(word in json.dumps(thing, ensure_ascii=False).lower()
+                             for word in words)]
+        for key, values in conditions.items():
+            if key in ('q', '_q') or key.startswith('_'):
+                continue
+            negate = key.startswith('not-')
+            path = key[len('not-'):] if negate else key
+            if '-' in path.split('.')[0]:
+                raise ValueError('unsupported parameter: {}'.format(key))
+            things = [thing for thing in things
+                      if negate != bool(set(values) & set(_values_at(thing, path)))]
+
+        total = len(things)
+        page = things[offset:offset + limit]
+
+        def link(page_offset):
+            page_query = dict(query, _limit=limit, _offset=page_offset)
+            return {'@id': '/find?' + urlencode(page_query)}
+
+        result = {'@id': link(offset)['@id'],
+                  '@type': 'PartialCollectionView',
+                  'totalItems': total,
+                  'itemOffset': offset,
+                  'itemsPerPage': limit,
+                  'first': link(0),
+                  'last': link(max(total - 1, 0) // limit * limit if limit else 0),
+                  'items': page,
+                  'search': {'mapping': [{'variable': key, 'equals': value}
+                                         for key, value in query.items()]}}
+        if offset + limit < total:
+            result['next'] = link(offset + limit)
+        if offset > 0:
+            result['previous'] = link(max(offset - limit, 0))
+        if total:
+            types = {}
+            for thing in things:
+                types[thing.get('@type')] = types.get(thing.get('@type'), 0) + 1
+            result['stats'] = {'sliceByDimension': {'@type': {
+                'dimension': '@type',
+                'observation': [{'totalItems': n, 'object': {'@id': t}}
+                                for t, n in sorted(types.items())]}}}
+        return result
+
+    # Tokens
+
+    def issue_token(self):
+        token = ''.join(random.choice(ID_CHARS) for _ in range(32))
+        with self.lock:
+            self.tokens[token] = time.time() + self.token_lifetime
+        return token
+
+    def valid_token(self, authorization):
+        if not authorization or not authorization.startswith('Bearer '):
+            return False
+        with self.lock:
+            expires_at = self.tokens.get(authorization[len('Bearer '):])
+        return expires_at is not None and time.time() < expires_at
+
+
+class Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # Headers and body are written separately, avoid delayed ACK stalls
+    disable_nagle_algorithm = True
+    xl = None
+
+    def log_message(self, format, *args):
+        pass
+
+    # Dispatch
+
+    def do_GET(self):
+        self.dispatch('GET')
+
+    def do_POST(self):
+        self.dispatch('POST')
+
+    def do_PUT(self):
+        self.dispatch('PUT')
+
+    def do_DELETE(self):
+        self.dispatch('DELETE')
+
+    def dispatch(self, method):
+        self.body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            self.route(method, urlparse(self.path))
+        except Exception as e:
+            # Answer like a failing server instead of dropping the connection
+            self.send(500, {'message': repr(e)}, 'application/json')
+
+    def route(self, method, url):
+        path = url.path
+        if path.startswith('/_es/'):
+            return self.elastic(path[len('/_es'):])
+        if path.startswith('/login'):
+            return self.login(method, url)
+        if path == '/':
+            return self.send(200, b'<html><body>Fake XL</body></html>',
+                             'text/html')
+        if path == '/find':
+            return self.find(url.query)
+        if method == 'POST' and path == '/data':
+            return self.create()
+        return self.record(method, path, parse_qs(url.query))
+
+    def send(self, status, body=b'', content_type='application/ld+json',
+             headers=None):
+        if isinstance(body, (dict, list)):
+            body = json.dumps(body).encode('utf-8')
+        elif isinstance(body, str):
+            body = body.encode('utf-8')
+        self.send_response(status)
+        if body:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def authorized(self):
+        if self.xl.valid_token(self.headers.get('Authorization')):
+            return True
+        self.send(401, {'message': 'invalid or expired token'},
+                  'application/json')
+        return False
+
+    # Elasticsearch
+
+    def elastic(self, path):
+        if path == '/_refresh':
+            self.xl.refresh()
+            return self.send(200, {'_shards': {'failed': 0}}, 'application/json')
+        if path == '/_search':
+            # Like Elasticsearch, which does not take e.g. application/ld+json
+            content_type = self.headers.get('Content-Type', 'application/json')
+            if self.body and content_type.split(';')[0].strip() != 'application/json':
+                return self.send(406, {'error': 'Content-Type header [{}] is not '
+                                       'supported'.format(content_type)},
+                                 'application/json')
+            query = json.loads(self.body or b'{}')
+            ids = set(query.get('query', {}).get('ids', {}).get('values', []))
+            with self.xl.lock:
+                hits = [{'_id': short_id, '_seq_no': seq_no, '_primary_term': 1}
+                        if query.get('seq_no_primary_term') else {'_id': short_id}
+                        for short_id, seq_no in sorted(self.xl.visible.items())
+                        if short_id in ids]
+            return self.send(200, {'hits': {'total': {'value': len(hits)},
+                                            'hits': hits}},
+                             'application/json')
+        self.send(404)
+
+    # OAuth
+
+    def login(self, method, url):
+        if method == 'GET' and url.path == '/login/oauth/authorize':
+            redirect = dict(parse_qsl(url.query)).get('redirect_uri',
+                                                      self.xl.base_url + '/')
+            return self.send(200, _form('loginForm', {
+                'csrf_token': 'login', 'next_redirect': redirect},
+                ['username', 'password']), 'text/html')
+        if method != 'POST':
+            return self.send(404)
+
+        form = dict(parse_qsl(self.body.decode('utf-8')))
+        if form.get('confirm') == 'y':
+            fragment = urlencode({'access_token': self.xl.issue_token(),
+                                  'token_type': 'Bearer',
+                                  'expires_in': self.xl.token_lifetime})
+            return self.send(302, headers={
+                'Location': self.xl.base_url + '/#' + fragment})
+        if form.get('username') != USERNAME or form.get('password') != PASSWORD:
+            return self.send(401, 'bad credentials', 'text/html')
+        self.send(200, _form('authorizeForm', {'csrf_token': 'confirm'}),
+                  'text/html')
+
+    # REST API
+
+    def find(self, query):
+        try:
+            result = self.xl.find(query)
+        except ValueError as e:
+            return self.send(400, {'message': str(e)}, 'application/json')
+        self.send(200, result)
+
+    def create(self):
+        if not self.authorized():
+            return
+        location = self.xl.create(json.loads(self.body))
+        self.send(201, headers={'Location': location})
+
+    def record(self, method, path, query):
+        record, redirect = self.xl.resolve(path)
+        if redirect:
+            return self.send(302, headers={'Location': redirect})
+        if record is None:
+            return self.send(404)
+
+        if method == 'GET':
+            return self.get(record, path, query)
+        if not self.authorized():
+            return
+        with self.xl.lock:
+            if record.deleted:
+                return self.send(410)
+            if method == 'PUT':
+                if self.headers.get('If-Match') != record.etag:
+                    return self.send(412)
+                record.versions.append(json.loads(self.body))
+                self.xl.changed(record)
+                return self.send(204, headers={'ETag': record.etag})
+            if method == 'DELETE':
+                if self.xl.dependants(record):
+                    return self.send(403)
+                record.deleted = True
+                self.xl.changed(record)
+                return self.send(204)
+        self.send(405)
+
+    def get(self, record, path, query):
+        version = int(query['version'][0]) if 'version' in query else -1
+        if version >= len(record.versions):
+            return self.send(410)
+        if record.deleted and 'version' not in query:
+            return self.send(410)
+
+        accept = self.headers.get('Accept', 'application/ld+json')
+        content_type = next((t for t, ext in JSON_TYPES.items()
+                             if path.endswith('.' + ext)), None)
+        if not content_type:
+            content_type = next((t for t in JSON_TYPES if t in accept),
+                                'application/ld+json' if '*/*' in accept else None)
+        if not content_type:
+            return self.send(406)
+
+        data = record.versions[version]
+        if query.get('framed', ['false'])[0].lower() == 'true' or 'lens' in query:
+            record_node, thing = data['@graph'][0], data['@graph'][1]
+            data = dict(record_node, mainEntity=thing)
+        location = '{}/data.{}'.format(record.graph()[0]['@id'],
+                                       JSON_TYPES[content_type])
+        self.send(200, data, content_type, headers={
+            'ETag': record.etag, 'Content-Location': location})
+
+
+def _form(form_id, hidden, fields=()):
+    inputs = ''.join('<input type="hidden" name="{}" value="{}">'.format(
+        name, html.escape(value, quote=True)) for name, value in hidden.items())
+    inputs += ''.join('<input name="{}">'.format(name) for name in fields)
+    return '<html><body><form id="{}" method="post">{}</form></body></html>'.format(
+        form_id, inputs)
+
+
+def _replace_strings(node, placeholder, value):
+    if isinstance(node, dict):
+        return {k: _replace_strings(v, placeholder, value) for k, v in node.items()}
+    if isinstance(node, list):
+        return [_replace_strings(v, placeholder, value) for v in node]
+    if isinstance(node, str) and node.startswith(placeholder):
+        return value + node[len(placeholder):]
+    return node
+
+
+def _has_same_as(node, uri):
+    return any(same_as.get('@id') == uri for same_as in node.get('sameAs', []))
+
+
+def _references(node, uri):
+    if isinstance(node, dict):
+        return node.get('@id') == uri and len(node) == 1 or \
+            any(_references(v, uri) for v in node.values())
+    if isinstance(node, list):
+        return any(_references(v, uri) for v in node)
+    return False
+
+
+def _values_at(node, path):
+    keys = path.split('.')
+    nodes = [node]
+    for key in keys:
+        next_nodes = []
+        for n in nodes:
+            if isinstance(n, dict) and key in n:
+                value = n[key]
+                next_nodes.extend(value if isinstance(value, list) else [value])
+        nodes = next_nodes
+    return [str(n) for n in nodes if not isinstance(n, (dict, list))]
+
+
+def start(host=DEFAULT_HOST, port=DEFAULT_PORT):
+    """Starts a fake in a daemon thread, returns (server, environment)."""
+    handler = type('FakeXLHandler', (Handler,), {'xl': FakeXL()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    base_url = 'http://{}:{}'.format(host, server.server_address[1])
+    handler.xl.base_url = base_url
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server, environment(base_url)
+
+
+def environment(base_url):
+    return {'LXLTESTING_ROOT_URL': base_url,
+            'LXLTESTING_API_URL': base_url,
+            'LXLTESTING_LOGIN_URL': base_url + '/login',
+            'LXLTESTING_ES_REFRESH_URL': base_url + '/_es/_refresh',
+            'LXLTESTING_USERNAME': USERNAME,
+            'LXLTESTING_PASSWORD': PASSWORD,
+            'LXLTESTING_OAUTH_CLIENT_ID': OAUTH_CLIENT_ID,
+            'OAUTHLIB_INSECURE_TRANSPORT': '1'}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--host', default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    server, env = start(args.host, args.port)
+    for name, value in env.items():
+        print('export {}={}'.format(name, value))
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
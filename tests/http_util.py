@@ -0,0 +1,176 @@
+from baseline_util import baseline_hook
+from bench_util import instrument
+from requests.adapters import BaseAdapter, HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+import base64
+import hashlib
+import io
+import json
+import os
+import requests
+
+
+DEFAULT_POOL_HOSTS = 20
+DEFAULT_POOL_MAXSIZE = 32
+DEFAULT_REPLAY_DIR = '.replay'
+
+# Number of hosts to keep connection pools for, and connections kept per
+# host. With LXLTESTING_POOL_BLOCK=1 no more than POOL_MAXSIZE connections
+# are opened to a host, requests wait for a free one instead.
+POOL_HOSTS = int(os.environ.get('LXLTESTING_POOL_HOSTS', DEFAULT_POOL_HOSTS))
+POOL_MAXSIZE = int(os.environ.get('LXLTESTING_POOL_MAXSIZE',
+                                  DEFAULT_POOL_MAXSIZE))
+POOL_BLOCK = os.environ.get('LXLTESTING_POOL_BLOCK', '0') == '1'
+KEEP_ALIVE = os.environ.get('LXLTESTING_KEEP_ALIVE', '1') == '1'
+
+# Record/replay of GET responses for sessions created with replayable=True:
+# 'off', 'record' (revalidating recorded responses with If-None-Match) or
+# 'replay' (offline, fails on requests that have not been recorded)
+REPLAY_MODE = os.environ.get('LXLTESTING_REPLAY', 'off')
+REPLAY_DIR = os.environ.get('LXLTESTING_REPLAY_DIR', DEFAULT_REPLAY_DIR)
+REPLAY_MODES = ('off', 'record', 'replay')
+assert REPLAY_MODE in REPLAY_MODES, \
+    'LXLTESTING_REPLAY must be one of {}'.format(', '.join(REPLAY_MODES))
+# Hop-by-hop headers, and headers describing the encoded body which is
+# stored decoded
+UNRECORDED_HEADERS = {'connection', 'keep-alive', 'transfer-encoding',
+                      'content-encoding', 'content-length'}
+
+# Shared by all sessions so that connections are reused across fixtures
+# and test modules
+adapter = HTTPAdapter(pool_connections=POOL_HOSTS,
+                      pool_maxsize=POOL_MAXSIZE,
+                      pool_block=POOL_BLOCK)
+
+
+def new_session(replayable=False):
+    """A requests session on the shared, instrumented connection pool.
+
+    If replayable, GET responses are recorded or replayed according to
+    LXLTESTING_REPLAY.
+    """
+    session = requests.session()
+    transport = adapter
+    if replayable and REPLAY_MODE != 'off':
+        transport = ReplayAdapter(adapter, REPLAY_MODE, REPLAY_DIR)
+    session.mount('http://', transport)
+    session.mount('https://', transport)
+    if not KEEP_ALIVE:
+        session.headers['Connection'] = 'close'
+    session.hooks['response'].append(baseline_hook)
+    return instrument(session)
+
+
+class ReplayAdapter(BaseAdapter):
+    """Records GET/HEAD responses to files and serves them back.
+
+    Responses are keyed on method, URL (including query parameters) and
+    Accept header. Other requests are passed on to the wrapped transport.
+    """
+
+    def __init__(self, transport, mode, directory):
+        super().__init__()
+        self.transport = transport
+        self.mode = mode
+        self.directory = directory
+
+    def send(self, request, **kwargs):
+        if request.method not in ('GET', 'HEAD'):
+            return self.transport.send(request, **kwargs)
+
+        path = os.path.join(self.directory, _replay_key(request) + '.json')
+        recorded = _read_recording(path)
+        if self.mode == 'replay':
+            if recorded is None:
+                raise requests.exceptions.ConnectionError(
+                    'no recorded response for {} {} (accept: {})'.format(
+                        request.method, request.url,
+                        request.headers.get('Accept')),
+                    request=request)
+            return self._build_response(request, recorded)
+
+        etag = recorded and CaseInsensitiveDict(recorded['headers']).get('ETag')
+        if etag and 'If-None-Match' not in request.headers:
+            request.headers['If-None-Match'] = etag
+        response = self.transport.send(request, **kwargs)
+        if response.status_code == 304 and etag:
+            response.close()
+            return self._build_response(request, recorded)
+
+        if response.status_code >= 500:
+            return response
+        recording = {'method': request.method,
+                     'url': request.url,
+                     'accept': request.headers.get('Accept'),
+                     'status': response.status_code,
+                     'reason': response.reason,
+                     'headers': {k: v for k, v in response.headers.items()
+                                 if k.lower() not in UNRECORDED_HEADERS},
+                     'body': base64.b64encode(response.content).decode('ascii')}
+        _write_recording(path, recording)
+        return response
+
+    def _build_response(self, request, recorded):
+        response = requests.Response()
+        response.status_code = recorded['status']
+        response.reason = recorded['reason']
+        response.headers = CaseInsensitiveDict(recorded['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        body = base64.b64decode(recorded['body'])
+        response.raw = io.BytesIO(body)
+        response._content = body
+        response._content_consumed = True
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        return response
+
+    def close(self):
+        # The wrapped transport is shared, it is not ours to close
+        pass
+
+
+def _replay_key(request):
+    key = '\n'.join([request.method, request.url,
+                     request.headers.get('Accept') or ''])
+    return hashlib.sha256(key.encode('utf-8')).hexdigest()
+
+
+def _read_recording(path):
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_recording(path, recording):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_file = '{}.{}.tmp'.format(path, os.getpid())
+    with open(tmp_file, 'w') as f:
+        json.dump(recording, f)
+    os.replace(tmp_file, path)
+
+
+def connection_stats():
+    # (host, requests, connections opened) for every pool still kept
+    pools = adapter.poolmanager.pools
+    stats = []
+    for key in pools.keys():
+        pool = pools.get(key)
+        if pool is None:
+            continue
+        host = '{}://{}:{}'.format(pool.scheme, pool.host, pool.port)
+        stats.append((host, pool.num_requests, pool.num_connections))
+    return sorted(stats)
+
+
+def connection_stats_lines():
+    lines = ['{:<50} {:>9} {:>12} {:>8}'.format(
+        'host', 'requests', 'connections', 'reused')]
+    for host, num_requests, num_connections in connection_stats():
+        reused = 1 - num_connections / num_requests if num_requests else 0
+        lines.append('{:<50} {:>9} {:>12} {:>7.0%}'.format(
+            host[-50:], num_requests, num_connections, reused))
+    return lines
@@ -0,0 +1,157 @@
+import codecs
+import json
+import re
+
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+# Matches any key in a path
+WILDCARD = '*'
+# Consumed input is dropped from the buffer once it is this long
+COMPACT_THRESHOLD = 64 * 1024
+WHITESPACE_PATTERN = re.compile(r'[ \t\n\r]*')
+# What may follow the part of a number decoded so far, if the number
+# continues in the next chunk
+NUMBER_TAIL_PATTERN = re.compile(r'[0-9.eE+-]*')
+
+
+class JsonWalker:
+    """Walks a JSON document arriving in chunks without decoding all of it.
+
+    Only the values at the requested paths are decoded, one at a time,
+    everything else is skipped over, so memory use is bounded by the size
+    of the largest requested value rather than by the document.
+    """
+
+    def __init__(self, chunks):
+        self.bytes_read = 0
+        self._chunks = iter(chunks)
+        self._decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def walk(self, *paths):
+        """Yields (path, value) for every value at one of the given paths.
+
+        Paths are tuples of object keys and array indices, WILDCARD matches
+        any key or index, e.g. ('items', WILDCARD) yields each search hit.
+        Values are yielded in document order.
+        """
+        yield from self._walk_value((), [tuple(path) for path in paths])
+
+    def _walk_value(self, path, paths):
+        if any(len(p) == len(path) for p in paths):
+            yield path, self._read_value()
+            return
+        c = self._peek()
+        if c == '{':
+            yield from self._walk_object(path, paths)
+        elif c == '[':
+            yield from self._walk_array(path, paths)
+        else:
+            self._read_value()
+
+    def _walk_object(self, path, paths):
+        self._expect('{')
+        if self._peek() == '}':
+            self._pos += 1
+            return
+        while True:
+            key = self._read_value()
+            self._expect(':')
+            child = path + (key,)
+            yield from self._walk_value(child, _below(child, paths))
+            if self._closes('}'):
+                return
+
+    def _walk_array(self, path, paths):
+        self._expect('[')
+        if self._peek() == ']':
+            self._pos += 1
+            return
+        index = 0
+        while True:
+            child = path + (index,)
+            yield from self._walk_value(child, _below(child, paths))
+            if self._closes(']'):
+                return
+            index += 1
+
+    def _read_value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self._json.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError:
+                # Read at least as much again as the value so far, so that
+                # a value spanning many chunks is not decoded once per chunk
+                if not self._fill(len(self._buffer) - self._pos):
+                    raise
+                continue
+            # A number at the end of the buffer, or followed only by what
+            # could be the rest of it (e.g. '2.' of '2.5'), may continue in
+            # the next chunk
+            if NUMBER_TAIL_PATTERN.fullmatch(self._buffer, end) and self._fill():
+                continue
+            self._pos = end
+            return value
+
+    def _peek(self):
+        while True:
+            self._pos = WHITESPACE_PATTERN.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                raise ValueError('unexpected end of JSON document')
+
+    def _next(self):
+        c = self._peek()
+        self._pos += 1
+        return c
+
+    def _expect(self, expected):
+        c = self._next()
+        if c != expected:
+            raise ValueError('expected {!r} at {}, got {!r}'.format(
+                expected, self._pos - 1, c))
+
+    def _closes(self, close):
+        # Consumes the separator after a member, True if it ends the container
+        c = self._next()
+        if c == close:
+            return True
+        if c != ',':
+            raise ValueError('expected {!r} or \',\' at {}, got {!r}'.format(
+                close, self._pos - 1, c))
+        return False
+
+    def _fill(self, size=1):
+        # Appends at least size characters if there are that many left,
+        # False if there was nothing left to read
+        if self._eof:
+            return False
+        if self._pos >= COMPACT_THRESHOLD:
+            self._buffer = self._buffer[self._pos:]
+            self._pos = 0
+        texts = []
+        length = 0
+        for chunk in self._chunks:
+            self.bytes_read += len(chunk)
+            text = self._decoder.decode(chunk)
+            texts.append(text)
+            length += len(text)
+            if length >= size:
+                break
+        else:
+            self._eof = True
+            texts.append(self._decoder.decode(b'', final=True))
+        text = ''.join(texts)
+        self._buffer += text
+        return bool(text)
+
+
+def _below(path, paths):
+    # The paths that path is on
+    return [p for p in paths if len(p) >= len(path) and
+            all(k == WILDCARD or k == key for k, key in zip(p, path))]
@@ -0,0 +1,103 @@
+from lxml import etree
+import argparse
+import time
+
+
+OAI_NS = '{http://www.openarchives.org/OAI/2.0/}'
+
+
+class CountingReader:
+    """File-like wrapper counting the bytes read from a stream."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes = 0
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.bytes += len(data)
+        return data
+
+
+def harvest(session, url, metadata_prefix, max_pages=None, on_record=None,
+            **params):
+    """Harvests ListRecords, following resumptionTokens.
+
+    Each page is streamed and parsed incrementally, records are discarded
+    once on_record (if given) has seen them, so memory use does not grow
+    with page or set size. Extra params (set, from, until) are passed on
+    the first request. Returns throughput and per page latency.
+    """
+    params = dict(params, verb='ListRecords', metadataPrefix=metadata_prefix)
+    pages = []
+    start = time.monotonic()
+
+    while True:
+        page_start = time.monotonic()
+        result = session.get(url, params=params, stream=True)
+        assert result.status_code == 200, result.status_code
+        result.raw.decode_content = True
+        reader = CountingReader(result.raw)
+
+        records = 0
+        token = None
+        for _, element in etree.iterparse(reader, events=('end',)):
+            if element.tag == OAI_NS + 'record':
+                records += 1
+                if on_record:
+                    on_record(element)
+                element.clear()
+                parent = element.getparent()
+                while element.getprevious() is not None:
+                    del parent[0]
+            elif element.tag == OAI_NS + 'resumptionToken':
+                token = (element.text or '').strip() or None
+            elif element.tag == OAI_NS + 'error':
+                # An empty set is not an error for a harvester
+                code = element.get('code')
+                assert code == 'noRecordsMatch', '{}: {}'.format(
+                    code, element.text)
+        result.close()
+
+        pages.append({'records': records,
+                      'bytes': reader.bytes,
+                      'seconds': time.monotonic() - page_start})
+        if not token or (max_pages and len(pages) >= max_pages):
+            break
+        params = {'verb': 'ListRecords', 'resumptionToken': token}
+
+    seconds = time.monotonic() - start
+    records = sum(page['records'] for page in pages)
+    nbytes = sum(page['bytes'] for page in pages)
+    return {'metadataPrefix': metadata_prefix,
+            'complete': token is None,
+            'pages': pages,
+            'records': records,
+            'bytes': nbytes,
+            'seconds': seconds,
+            'records_per_second': records / seconds if seconds else 0,
+            'bytes_per_second': nbytes / seconds if seconds else 0}
+
+
+if __name__ == '__main__':
+    import http_util
+
+    parser = argparse.ArgumentParser(
+        description='Harvest an OAI-PMH endpoint and report throughput')
+    parser.add_argument('url')
+    parser.add_argument('metadata_prefix', nargs='+')
+    parser.add_argument('--set')
+    parser.add_argument('--max-pages', type=int)
+    args = parser.parse_args()
+
+    session = http_util.new_session()
+    extra = {'set': args.set} if args.set else {}
+    for prefix in args.metadata_prefix:
+        stats = harvest(session, args.url, prefix, args.max_pages, **extra)
+        latencies = sorted(page['seconds'] for page in stats['pages'])
+        print('{}: {} records in {} pages, {:.1f} records/s, {:.0f} kB/s, '
+              'median page {:.0f} ms{}'.format(
+                  prefix, stats['records'], len(stats['pages']),
+                  stats['records_per_second'], stats['bytes_per_second'] / 1000,
+                  latencies[len(latencies) // 2] * 1000,
+                  '' if stats['complete'] else ' (incomplete)'))
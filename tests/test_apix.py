@@ -1,6 +1,9 @@
 from conf_util import *
+import bench_util
+import itertools
 import os
 import sys # sys.stderr.write('hej\n')
+import time
 import xml.etree.ElementTree as ET
 
 pytestmark = pytest.mark.dev
@@ -13,6 +16,13 @@ ROOT_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir)
 HOLD_FILE = os.path.join(ROOT_DIR, "resources", "hold.marcxml")
 BIB_FILE = os.path.join(ROOT_DIR, "resources", "bib.marcxml")
 
+# Bib records for the bulk ingest: a MARCXML file with one record or a
+# collection, or a directory of such files. Records are reused in turn until
+# APIX_BULK_COUNT have been sent.
+APIX_BULK_SOURCE = os.environ.get('LXLTESTING_APIX_BULK_SOURCE', BIB_FILE)
+APIX_BULK_COUNT = int(os.environ.get('LXLTESTING_APIX_BULK_COUNT', 20))
+APIX_BULK_MAX_ERROR_RATE = float(os.environ.get('LXLTESTING_APIX_BULK_MAX_ERROR_RATE', 0))
+
 
 def test_get_nonexisting_record(apix_session):
     result = apix_session.get(APIX_URL + '0.1/cat/libris/bib/a0a0a0a0a0a0a0a0')
@@ -197,6 +207,96 @@ def test_search_urnnbn(apix_session):
     assert 'Denne dag, et liv.' in result.text
 
 
+@pytest.mark.bench
+def test_bulk_ingest(apix_session):
+    records = list(itertools.islice(itertools.cycle(_marcxml_records(APIX_BULK_SOURCE)),
+                                    APIX_BULK_COUNT))
+    hold_payload = _read_file(HOLD_FILE)
+    # Appended to as soon as a record exists, so that it is cleaned up even if
+    # the rest of its ingest fails
+    bib_ids = []
+    hold_ids = []
+    bib_timings = []
+    hold_timings = []
+
+    def put_new(url, payload, timings):
+        start = time.monotonic()
+        result = apix_session.put(url, data=payload)
+        timings.append(time.monotonic() - start)
+        assert result.status_code == 201, result.status_code
+        return result.headers['Location'].split("/")[-1]
+
+    def ingest(payload):
+        bib_id = put_new(APIX_URL + '0.1/cat/libris/bib/new', payload,
+                         bib_timings)
+        bib_ids.append(bib_id)
+        hold_id = put_new(APIX_URL + '0.1/cat/libris/bib/' + bib_id + '/newhold',
+                          hold_payload, hold_timings)
+        hold_ids.append(hold_id)
+
+    def delete(path):
+        result = apix_session.delete(APIX_URL + '0.1/cat/libris/' + path)
+        assert result.status_code == 200, '{} {}'.format(path, result.status_code)
+
+    try:
+        start = time.monotonic()
+        errors = [e for e in run_concurrently(ingest, records, return_exceptions=True)
+                  if e is not None]
+        ingest_seconds = time.monotonic() - start
+    finally:
+        # Holdings first, bibs with holdings can't be deleted. Failures are
+        # collected so that one failed delete doesn't leave the rest behind.
+        start = time.monotonic()
+        cleanup_errors = [e for e in
+                          run_concurrently(delete, ['hold/' + hold_id for hold_id in hold_ids],
+                                           return_exceptions=True) +
+                          run_concurrently(delete, ['bib/' + bib_id for bib_id in bib_ids],
+                                           return_exceptions=True)
+                          if e is not None]
+        cleanup_seconds = time.monotonic() - start
+
+    error_rate = len(errors) / len(records)
+    bench_util.add_report(
+        'apix bulk ingest',
+        ['phase', 'records', 'records/s', 'errors', 'p50 ms', 'p95 ms', 'max ms'],
+        [['bib/new', len(bib_timings), len(bib_ids) / ingest_seconds,
+          len(bib_timings) - len(bib_ids), *bench_util.latency_stats(bib_timings)[1:]],
+         ['newhold', len(hold_timings), len(hold_ids) / ingest_seconds,
+          len(hold_timings) - len(hold_ids), *bench_util.latency_stats(hold_timings)[1:]],
+         ['cleanup', len(bib_ids) + len(hold_ids),
+          (len(bib_ids) + len(hold_ids)) / cleanup_seconds, len(cleanup_errors),
+          None, None, None]])
+
+    assert not cleanup_errors, \
+        '{} records could not be deleted, first error: {!r}'.format(
+            len(cleanup_errors), cleanup_errors[0])
+
+    assert error_rate <= APIX_BULK_MAX_ERROR_RATE, \
+        '{} of {} records failed, first error: {!r}'.format(
+            len(errors), len(records), errors[0])
+
+
+def _marcxml_records(source):
+    # The <record> elements of a MARCXML file, or of all .marcxml files in a
+    # directory, serialized
+    if os.path.isdir(source):
+        filenames = sorted(os.path.join(source, filename)
+                           for filename in os.listdir(source)
+                           if filename.endswith('.marcxml'))
+    else:
+        filenames = [source]
+
+    records = []
+    for filename in filenames:
+        root = ET.parse(filename).getroot()
+        elements = [root] if root.tag.endswith('record') else \
+            [element for element in root if element.tag.endswith('record')]
+        records.extend(ET.tostring(element, encoding='utf-8')
+                       for element in elements)
+    assert records, 'no MARCXML records in {}'.format(source)
+    return records
+
+
 def _read_file(filename):
     with open(filename, 'r') as f:
         payload = f.read()
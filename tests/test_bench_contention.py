@@ -0,0 +1,72 @@
+from conf_util import *
+import bench_util
+
+pytestmark = [pytest.mark.dev, pytest.mark.bench]
+
+# Workers updating the same holding at once, and successful updates each
+# one makes
+CONTENTION_WORKERS = int(os.environ.get('LXLTESTING_CONTENTION_WORKERS', 8))
+CONTENTION_UPDATES = int(os.environ.get('LXLTESTING_CONTENTION_UPDATES', 5))
+# Attempts a worker may make per successful update before giving up
+CONTENTION_MAX_ATTEMPTS = 50
+
+
+def test_if_match_contention(session, load_holding):
+    holding_id = load_holding(session)
+    result = session.get(holding_id)
+    assert result.status_code == 200
+    initial_level = result.json()['@graph'][1]['inventoryLevel']
+    seq_no = indexed_seq_no(session, holding_id)
+
+    # (status, seconds) of every PUT
+    puts = []
+
+    def worker(_):
+        for _ in range(CONTENTION_UPDATES):
+            for _ in range(CONTENTION_MAX_ATTEMPTS):
+                result = session.get(holding_id, params={"embellished": "false"})
+                assert result.status_code == 200
+                payload = result.json()
+                # Counts successful updates, a lost update shows as a
+                # level lower than the number of 204s
+                payload['@graph'][1]['inventoryLevel'] += 1
+                # Not put_record, which would look up the index between the
+                # GET and the PUT and so widen the window for conflicts
+                headers = {'Content-Type': 'application/ld+json',
+                           'If-Match': result.headers['ETag'],
+                           XL_ACTIVE_SIGEL_HEADER: ACTIVE_SIGEL}
+                start = time.monotonic()
+                result = session.put(holding_id, data=json.dumps(payload),
+                                     headers=headers)
+                puts.append((result.status_code, time.monotonic() - start))
+                if result.status_code == 204:
+                    break
+                assert result.status_code == 412, result.status_code
+            else:
+                raise AssertionError('no update after {} attempts'.format(
+                    CONTENTION_MAX_ATTEMPTS))
+
+    start = time.monotonic()
+    run_concurrently(worker, range(CONTENTION_WORKERS),
+                     max_workers=CONTENTION_WORKERS)
+    seconds = time.monotonic() - start
+    expect_reindexed(holding_id, seq_no)
+    trigger_elastic_refresh(session, holding_id)
+
+    written = [elapsed for status, elapsed in puts if status == 204]
+    conflicts = [elapsed for status, elapsed in puts if status == 412]
+    bench_util.add_report(
+        'if-match contention',
+        ['put', 'count', 'per s', 'share', 'p50 ms', 'p95 ms', 'max ms'],
+        [['204', *_stats(written, puts, seconds)],
+         ['412', *_stats(conflicts, puts, seconds)]])
+
+    result = session.get(holding_id)
+    assert result.status_code == 200
+    assert len(written) == CONTENTION_WORKERS * CONTENTION_UPDATES
+    assert result.json()['@graph'][1]['inventoryLevel'] == initial_level + len(written)
+
+
+def _stats(timings, puts, seconds):
+    count, p50, p95, slowest = bench_util.latency_stats(timings)
+    return [count, count / seconds, count / len(puts), p50, p95, slowest]
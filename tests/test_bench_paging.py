@@ -0,0 +1,71 @@
+from conf_util import *
+import bench_util
+
+pytestmark = [pytest.mark.dev, pytest.mark.bench]
+
+# Pages to walk per query, and page size. The defaults go past
+# MAX_RESULT_WINDOW, where Elasticsearch stops serving from/size paging.
+PAGING_DEPTH = int(os.environ.get('LXLTESTING_PAGING_DEPTH', 60))
+PAGING_LIMIT = int(os.environ.get('LXLTESTING_PAGING_LIMIT', 200))
+MAX_RESULT_WINDOW = int(os.environ.get('LXLTESTING_MAX_RESULT_WINDOW', 10000))
+# A page is degraded when its latency is this many times the median of the
+# first pages
+DEGRADATION_FACTOR = float(os.environ.get('LXLTESTING_PAGING_DEGRADATION_FACTOR', 3))
+BASELINE_PAGES = 5
+# Pages listed per query in the profile
+PROFILE_ROWS = 20
+
+QUERIES = {
+    'everything': {'q': '*'},
+    'instances': {'q': '*', '@type': 'Instance'},
+    'language': {'o': 'https://id.kb.se/language/ger'},
+}
+
+
+@pytest.mark.parametrize('name', QUERIES)
+def test_deep_pagination(session, name):
+    query_params = dict(QUERIES[name], _limit=PAGING_LIMIT)
+    pages = []
+
+    result = session.get(ROOT_URL + '/find', params=query_params)
+    assert result.status_code == 200
+    while True:
+        body = result.json() if result.status_code == 200 else {}
+        offset = pages[-1]['offset'] + PAGING_LIMIT if pages else 0
+        pages.append({'offset': body.get('itemOffset', offset),
+                      'status': result.status_code,
+                      'seconds': result.elapsed.total_seconds(),
+                      'bytes': len(result.content)})
+        if 'next' not in body or len(pages) >= PAGING_DEPTH:
+            break
+        result = session.get(ROOT_URL + body['next']['@id'])
+
+    baseline = bench_util.percentile([page['seconds'] for page in pages[:BASELINE_PAGES]], 50)
+    degraded = next((page['offset'] for page in pages
+                     if page['seconds'] > baseline * DEGRADATION_FACTOR), None)
+    failed = next((page for page in pages if page['status'] != 200), None)
+
+    step = max(len(pages) // PROFILE_ROWS, 1)
+    profile = pages[::step]
+    if profile[-1] is not pages[-1]:
+        profile.append(pages[-1])
+    for page in profile:
+        flags = []
+        if page['offset'] + PAGING_LIMIT > MAX_RESULT_WINDOW:
+            flags.append('past max_result_window')
+        if page['seconds'] > baseline * DEGRADATION_FACTOR:
+            flags.append('degraded')
+        if page['status'] != 200:
+            flags.append('status {}'.format(page['status']))
+        bench_util.report_row(
+            'deep pagination profile',
+            ['query', 'offset', 'ms', 'kB', 'x first pages', 'flags'],
+            [name, page['offset'], page['seconds'] * 1000, page['bytes'] / 1000,
+             page['seconds'] / baseline if baseline else None, ', '.join(flags) or '-'])
+
+    bench_util.report_row(
+        'deep pagination',
+        ['query', 'pages', 'last offset', 'first pages ms', 'last ms',
+         'degraded from offset', 'failed at offset'],
+        [name, len(pages), pages[-1]['offset'], baseline * 1000,
+         pages[-1]['seconds'] * 1000, degraded, failed and failed['offset']])
@@ -0,0 +1,46 @@
+from conf_util import *
+import bench_util
+import gzip
+
+pytestmark = [pytest.mark.dev, pytest.mark.bench]
+
+SERIALIZATION_REPEAT = int(os.environ.get('LXLTESTING_SERIALIZATION_REPEAT', 5))
+# Space separated record URLs to compare, large ones show the serializer cost
+SERIALIZATION_RECORDS = os.environ.get(
+    'LXLTESTING_SERIALIZATION_RECORDS',
+    '{0}/sys/context/kbv {0}/vocab/'.format(ID_URL)).split()
+SEARCH_LIMITS = [1, 20, 200]
+
+
+def test_serialization_cost(session, load_bib):
+    targets = [('new bib', load_bib(), None)] + \
+        [(url, url, None) for url in SERIALIZATION_RECORDS] + \
+        [('/find _limit={}'.format(limit), ROOT_URL + '/find',
+          {'q': 'mumintrollet', '_limit': limit})
+         for limit in SEARCH_LIMITS]
+
+    for name, url, params in targets:
+        rows = []
+        for content_type in NON_HTML_CONTENT_TYPES:
+            headers = {'Accept': content_type}
+            latencies, _ = bench_util.sample_responses(
+                lambda: session.get(url, params=params, headers=headers),
+                repeat=SERIALIZATION_REPEAT)
+            result = session.get(url, params=params, headers=headers)
+            assert content_type in result.headers['Content-Type'], url
+            compressed = len(gzip.compress(result.content))
+            rows.append([name, content_type,
+                         bench_util.percentile(latencies, 50) * 1000,
+                         bench_util.percentile(latencies, 95) * 1000,
+                         len(result.content) / 1000,
+                         len(result.content) / compressed if compressed else None])
+
+        fastest = min(row[2] for row in rows)
+        slowest = max(row[2] for row in rows)
+        for row in rows:
+            bench_util.report_row(
+                'serialization cost',
+                ['resource', 'content type', 'p50 ms', 'p95 ms', 'kB',
+                 'gzip ratio', 'x fastest', 'note'],
+                row + [row[2] / fastest if fastest else None,
+                       'slowest' if row[2] == slowest else ''])
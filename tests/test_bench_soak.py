@@ -0,0 +1,160 @@
+from conf_util import *
+import bench_util
+
+pytestmark = [pytest.mark.dev, pytest.mark.bench]
+
+# Seconds to run the soak for, it is skipped when not set
+SOAK_DURATION = float(os.environ.get('LXLTESTING_SOAK_DURATION', 0))
+# Iterations started per minute
+SOAK_RATE = float(os.environ.get('LXLTESTING_SOAK_RATE', 30))
+# Windows are this many seconds long and start half a window apart. Each is
+# compared to the first: a window drifts if its p95 iteration time is more
+# than SOAK_LATENCY_DRIFT times that of the first, its error rate more
+# than SOAK_ERROR_DRIFT higher, or if no iteration started in it.
+SOAK_WINDOW = float(os.environ.get('LXLTESTING_SOAK_WINDOW', 300))
+SOAK_LATENCY_DRIFT = float(os.environ.get('LXLTESTING_SOAK_LATENCY_DRIFT', 1.5))
+SOAK_ERROR_DRIFT = float(os.environ.get('LXLTESTING_SOAK_ERROR_DRIFT', 0.05))
+SOAK_QUERY = {'q': '*', '_limit': 20}
+
+STEPS = ['create bib', 'create holding', 'update holding', 'search',
+         'delete holding', 'delete bib']
+
+
+@pytest.mark.skipif(not SOAK_DURATION, reason='set LXLTESTING_SOAK_DURATION to soak')
+def test_soak(session):
+    # Records that exist, the session's token auth renews the token as it
+    # expires during the run
+    bib_ids = set()
+    holding_ids = set()
+    iterations = []
+
+    interval = 60 / SOAK_RATE
+    start = time.monotonic()
+    next_start = start
+    try:
+        while next_start - start < SOAK_DURATION:
+            delay = next_start - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            # Iterations that fall behind push the schedule instead of
+            # being made up for with a burst
+            now = time.monotonic()
+            next_start = max(next_start, now) + interval
+            iterations.append(_iteration(session, bib_ids, holding_ids,
+                                         now - start))
+    finally:
+        delete_records(session, list(holding_ids))
+        delete_records(session, list(bib_ids))
+
+    windows = _windows(iterations)
+    first = windows[0]
+    drifted = []
+    for window in windows:
+        flags = []
+        if not window['iterations']:
+            flags.append('stalled')
+        if window['p95'] and first['p95'] and \
+                window['p95'] > first['p95'] * SOAK_LATENCY_DRIFT:
+            flags.append('latency')
+        if window['error_rate'] is not None and \
+                window['error_rate'] - first['error_rate'] > SOAK_ERROR_DRIFT:
+            flags.append('errors')
+        if flags:
+            drifted.append(window)
+        bench_util.report_row(
+            'soak windows',
+            ['from min', 'iterations', 'error rate', 'p50 ms', 'p95 ms',
+             'x first p95', 'drift'],
+            [window['start'] / 60, len(window['iterations']), window['error_rate'],
+             window['p50'], window['p95'],
+             window['p95'] / first['p95'] if window['p95'] and first['p95'] else None,
+             ', '.join(flags) or '-'])
+
+    last = windows[-1]
+    for step in STEPS:
+        before = _step_p95(first, step)
+        after = _step_p95(last, step)
+        bench_util.report_row(
+            'soak steps',
+            ['step', 'first window p95 ms', 'last window p95 ms', 'x first'],
+            [step, before, after, after / before if before and after else None])
+
+    errors = [iteration['error'] for iteration in iterations if iteration['error']]
+    assert not drifted, '{} of {} windows drifted, from minute {:.1f}{}'.format(
+        len(drifted), len(windows), drifted and drifted[0]['start'] / 60,
+        ', first error: ' + errors[0] if errors else '')
+
+
+def _iteration(session, bib_ids, holding_ids, offset):
+    # One round of the soak. Records are added to and removed from the id
+    # sets as they are created and deleted, so that what is left after an
+    # error can be cleaned up.
+    steps = {}
+
+    def step(name, fn):
+        start = time.monotonic()
+        value = fn()
+        steps[name] = time.monotonic() - start
+        return value
+
+    def update(holding_id):
+        result = session.get(holding_id, params={"embellished": "false"})
+        assert result.status_code == 200
+        result = update_holding(session, holding_id, result.json(),
+                                result.headers['ETag'])
+        assert result.status_code == 204, result.status_code
+
+    def search():
+        result = session.get(ROOT_URL + '/find', params=SOAK_QUERY)
+        assert result.status_code == 200, result.status_code
+
+    def delete(record_id, record_ids):
+        result = delete_record(session, record_id)
+        assert result.status_code == 204, result.status_code
+        record_ids.discard(record_id)
+
+    error = None
+    try:
+        bib_id = step('create bib', lambda: create_bib(session))
+        bib_ids.add(bib_id)
+        holding_id = step('create holding',
+                          lambda: create_holding(session, item_of=bib_id))
+        holding_ids.add(holding_id)
+        step('update holding', lambda: update(holding_id))
+        step('search', search)
+        step('delete holding', lambda: delete(holding_id, holding_ids))
+        step('delete bib', lambda: delete(bib_id, bib_ids))
+    except Exception as e:
+        error = repr(e)
+    return {'offset': offset, 'steps': steps, 'error': error}
+
+
+def _windows(iterations):
+    # Sliding windows over the iterations, only the first may be shorter
+    # than SOAK_WINDOW
+    end = iterations[-1]['offset']
+    stride = SOAK_WINDOW / 2
+    count = int((end - SOAK_WINDOW) // stride) + 1 if end >= SOAK_WINDOW else 1
+    windows = []
+    for i in range(count):
+        start = i * stride
+        included = [iteration for iteration in iterations
+                    if start <= iteration['offset'] < start + SOAK_WINDOW]
+        timings = [sum(iteration['steps'].values()) for iteration in included
+                   if not iteration['error']]
+        _, p50, p95, _ = bench_util.latency_stats(timings)
+        errors = sum(1 for iteration in included if iteration['error'])
+        windows.append({'start': start,
+                        'iterations': included,
+                        # None for a window no iteration started in, i.e.
+                        # one stalled for more than half a window
+                        'error_rate': errors / len(included) if included else None,
+                        'p50': p50,
+                        'p95': p95})
+    return windows
+
+
+def _step_p95(window, step):
+    timings = [iteration['steps'][step] for iteration in window['iterations']
+               if step in iteration['steps']]
+    return bench_util.latency_stats(timings)[2]
@@ -0,0 +1,74 @@
+from conf_util import *
+import bench_util
+
+pytestmark = [pytest.mark.dev, pytest.mark.bench]
+
+FIND_API = ROOT_URL + "/find"
+# Requests per stats variant, after one warmup request
+STATS_REPEAT = int(os.environ.get('LXLTESTING_STATS_REPEAT', 5))
+
+# The slices of test_get_stats, without nesting
+SLICES = [
+    {"dimensionChain": ["rdf:type"], "itemLimit": 100},
+    {"dimensionChain": ["instanceType"], "itemLimit": 100},
+    {"dimensionChain": ["findCategory"], "itemLimit": 20},
+    {"dimensionChain": ["instanceCategory"], "itemLimit": 100},
+    {"dimensionChain": ["language"], "itemLimit": 100},
+    {"dimensionChain": ["itemHeldByOrg"], "itemLimit": 1000, "countTopLevelDocs": True},
+    {"dimensionChain": ["yearPublished"], "itemLimit": 500, "range": True},
+    {"dimensionChain": ["contributor"], "itemLimit": 20},
+    {"dimensionChain": ["subject"], "itemLimit": 100},
+    {"dimensionChain": ["bibliography"], "itemLimit": 200},
+    {"dimensionChain": ["workType"], "itemLimit": 100}
+]
+NESTED_SLICES = [
+    {"dimensionChain": ["findCategory"], "itemLimit": 20},
+    {"dimensionChain": ["identifyCategory"], "itemLimit": 50},
+    {"dimensionChain": ["instanceType"], "itemLimit": 20}
+]
+
+
+@pytest.mark.parametrize('type', ['Instance', 'Work'])
+def test_stats_cost(session, type):
+    baseline = None
+    for variant, slice_list in _stats_variants():
+        query_params = {'_q': 'type:' + type,
+                        '_appConfig': json.dumps({'statistics': {'sliceList': slice_list}})}
+        latencies, sizes = bench_util.sample_responses(
+            lambda: session.get(FIND_API, params=query_params),
+            repeat=STATS_REPEAT)
+
+        p50 = bench_util.percentile(latencies, 50) * 1000
+        if baseline is None:
+            baseline = p50
+        bench_util.report_row(
+            'stats cost',
+            ['type', 'variant', 'p50 ms', 'p95 ms', 'kB', 'p50 ms over none'],
+            [type, variant, p50, bench_util.percentile(latencies, 95) * 1000,
+             sizes[-1] / 1000, p50 - baseline])
+
+
+def _stats_variants():
+    # (name, sliceList), the first without any slices to compare against
+    yield 'none', []
+    for count in (1, 2, 4, 8, len(SLICES)):
+        yield '{} slices'.format(count), SLICES[:count]
+    for item_limit in (10, 100, 1000, 5000):
+        yield 'subject itemLimit {}'.format(item_limit), \
+            [{"dimensionChain": ["subject"], "itemLimit": item_limit}]
+    for depth in range(1, len(NESTED_SLICES) + 1):
+        yield 'nesting depth {}'.format(depth), [_nested(NESTED_SLICES[:depth])]
+    for dimension in ('language', 'itemHeldByOrg'):
+        for connective in (None, 'OR'):
+            stats_slice = {"dimensionChain": [dimension], "itemLimit": 100}
+            if connective:
+                stats_slice['connective'] = connective
+            yield '{} connective {}'.format(dimension, connective or 'default'), [stats_slice]
+
+
+def _nested(slices):
+    # The first slice, with each following one nested in the one before
+    nested = dict(slices[0])
+    if len(slices) > 1:
+        nested['slice'] = _nested(slices[1:])
+    return nested
@@ -0,0 +1,57 @@
+from conf_util import *
+from json_stream import DEFAULT_CHUNK_SIZE, JsonWalker, WILDCARD
+import bench_util
+
+# Not replayable: recording would read the whole body and defeat streaming
+pytestmark = [pytest.mark.dev, pytest.mark.bench]
+
+# Page size and stats itemLimit for the streamed search
+STREAM_LIMIT = int(os.environ.get('LXLTESTING_STREAM_LIMIT', 1000))
+STREAM_ITEM_LIMIT = int(os.environ.get('LXLTESTING_STREAM_ITEM_LIMIT', 1000))
+
+
+def test_stream_large_result(session):
+    statistics = {
+        "sliceList": [
+            {"dimensionChain": ["itemHeldByOrg"], "itemLimit": STREAM_ITEM_LIMIT, "connective": "OR", "countTopLevelDocs": True},
+            {"dimensionChain": ["language"], "itemLimit": STREAM_ITEM_LIMIT},
+            {"dimensionChain": ["subject"], "itemLimit": STREAM_ITEM_LIMIT}
+        ]
+    }
+    query_params = {'_q': 'type:Instance',
+                    '_limit': STREAM_LIMIT,
+                    '_appConfig': json.dumps({'statistics': statistics})}
+
+    total_items = None
+    items = 0
+    observations = {}
+    with bench_util.traced_memory() as memory:
+        result = session.get(ROOT_URL + "/find", params=query_params, stream=True)
+        assert result.status_code == 200
+
+        walker = JsonWalker(result.iter_content(DEFAULT_CHUNK_SIZE))
+        for path, value in walker.walk(('totalItems',),
+                                       ('items', WILDCARD),
+                                       ('stats', 'sliceByDimension', WILDCARD, 'observation', WILDCARD)):
+            if path[0] == 'totalItems':
+                total_items = value
+            elif path[0] == 'items':
+                items += 1
+                assert value['@id']
+            else:
+                dimension = path[2]
+                observations[dimension] = observations.get(dimension, 0) + 1
+                assert value['totalItems'] > 0
+                assert value['object']
+        result.close()
+
+    assert total_items > STREAM_LIMIT
+    assert items == STREAM_LIMIT
+    assert observations
+    assert all(count <= STREAM_ITEM_LIMIT for count in observations.values())
+
+    bench_util.report_row(
+        'streamed search',
+        ['test', 'items', 'observations', 'kB', 'peak kB'],
+        ['test_stream_large_result', items, sum(observations.values()),
+         walker.bytes_read / 1000, memory['peak'] / 1000])
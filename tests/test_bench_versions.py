@@ -0,0 +1,73 @@
+from conf_util import *
+import bench_util
+
+pytestmark = [pytest.mark.dev, pytest.mark.bench]
+
+# Updates made to the record, which then has VERSION_COUNT + 1 versions
+VERSION_COUNT = int(os.environ.get('LXLTESTING_VERSION_COUNT', 100))
+VERSION_REPEAT = int(os.environ.get('LXLTESTING_VERSION_REPEAT', 5))
+# Fails if getting the last version takes more than this many times as long
+# as getting the first one (median of VERSION_REPEAT requests)
+VERSION_MAX_GROWTH = float(os.environ.get('LXLTESTING_VERSION_MAX_GROWTH', 3))
+
+
+def test_version_history(session, load_bib):
+    bib_id = load_bib()
+
+    put_timings = []
+    for version in range(1, VERSION_COUNT + 1):
+        result = session.get(bib_id, params={"embellished": "false"})
+        assert result.status_code == 200
+        json_body = result.json()
+        json_body['@graph'][1]['dimensions'] = 'version {}'.format(version)
+
+        result = put_record(session, json_body['@graph'][1]['@id'],
+                            headers={'If-Match': result.headers['ETag']},
+                            data=json.dumps(json_body), allow_redirects=False)
+        # Only the PUT, not the index lookup put_record makes first
+        put_timings.append(result.elapsed.total_seconds())
+        assert result.status_code == 204
+
+    p50 = {}
+    versions = sorted({0, VERSION_COUNT // 4, VERSION_COUNT // 2,
+                       VERSION_COUNT * 3 // 4, VERSION_COUNT})
+    for version in versions:
+        url = '{}?version={}'.format(bib_id, version)
+        latencies, sizes = bench_util.sample_responses(lambda: session.get(url),
+                                                       repeat=VERSION_REPEAT)
+        p50[version] = bench_util.percentile(latencies, 50)
+        _add_row(version, latencies, sizes)
+        if version:
+            result = session.get(url)
+            assert result.json()['@graph'][1]['dimensions'] == 'version {}'.format(version)
+
+    latencies, sizes = bench_util.sample_responses(lambda: session.get(bib_id),
+                                                   repeat=VERSION_REPEAT)
+    _add_row('latest', latencies, sizes)
+
+    for version in (VERSION_COUNT + 1, VERSION_COUNT + 1000):
+        latencies = []
+        for _ in range(VERSION_REPEAT):
+            result = session.get('{}?version={}'.format(bib_id, version))
+            assert not 200 <= result.status_code < 300
+            latencies.append(result.elapsed.total_seconds())
+        _add_row('{} (missing)'.format(version), latencies, [len(result.content)])
+
+    bench_util.add_report(
+        'version history updates',
+        ['updates', 'count', 'p50 ms', 'p95 ms', 'max ms'],
+        [['first half', *bench_util.latency_stats(put_timings[:VERSION_COUNT // 2])],
+         ['second half', *bench_util.latency_stats(put_timings[VERSION_COUNT // 2:])]])
+
+    growth = p50[VERSION_COUNT] / p50[0]
+    assert growth <= VERSION_MAX_GROWTH, \
+        'version {} takes {:.1f} times as long as version 0'.format(
+            VERSION_COUNT, growth)
+
+
+def _add_row(version, latencies, sizes):
+    bench_util.report_row(
+        'version history',
+        ['version', 'p50 ms', 'p95 ms', 'kB'],
+        [version, bench_util.percentile(latencies, 50) * 1000,
+         bench_util.percentile(latencies, 95) * 1000, sizes[-1] / 1000])
@@ -0,0 +1,54 @@
+from conf_util import *
+import bench_util
+import itertools
+
+pytestmark = [pytest.mark.dev, pytest.mark.bench]
+
+VIEW_REPEAT = int(os.environ.get('LXLTESTING_VIEW_REPEAT', 5))
+# Search for the record to profile, the one of test_get_with_lens by default
+VIEW_QUERY = os.environ.get('LXLTESTING_VIEW_QUERY',
+                            '9789187745317+nya+konditionstest+cykel')
+
+VIEWS = ['', '/data', '/data.jsonld', '/data.json']
+PARAMETERS = [{}] + \
+    [{'framed': framed, 'embellished': embellished}
+     for framed, embellished in itertools.product(['true', 'false'], repeat=2)] + \
+    [{'lens': lens} for lens in ['chip', 'card']]
+
+
+def test_view_cost(session):
+    bib_id = find_id(session, VIEW_QUERY)
+
+    rows = []
+    for view, params in itertools.product(VIEWS, PARAMETERS):
+        url = bib_id + view
+        latencies, sizes = bench_util.sample_responses(
+            lambda: session.get(url, params=params), repeat=VIEW_REPEAT)
+        entities = _count_entities(session.get(url, params=params).json())
+        variant = (view or '/') + ('?' + '&'.join('{}={}'.format(k, v)
+                                                  for k, v in params.items())
+                                   if params else '')
+        rows.append([variant, bench_util.percentile(latencies, 50) * 1000,
+                     bench_util.percentile(latencies, 95) * 1000,
+                     sizes[-1] / 1000, entities])
+
+    cheapest = min(row[1] for row in rows)
+    slowest = max(row[1] for row in rows)
+    bench_util.add_report(
+        'view cost',
+        ['variant', 'p50 ms', 'p95 ms', 'kB', 'entities', 'x cheapest', 'note'],
+        [row + [row[1] / cheapest if cheapest else None,
+                'slowest' if row[1] == slowest else '']
+         for row in rows])
+
+
+def _count_entities(node):
+    # Described nodes with an @id, wherever they are in the document. Bare
+    # links ({"@id": ...}) are not counted, they are what embellishing
+    # replaces with descriptions.
+    if isinstance(node, list):
+        return sum(_count_entities(value) for value in node)
+    if isinstance(node, dict):
+        return ('@id' in node and len(node) > 1) + \
+            sum(_count_entities(value) for value in node.values())
+    return 0
@@ -1,6 +1,6 @@
 from conf_util import *
 
-pytestmark = pytest.mark.qa
+pytestmark = [pytest.mark.qa, pytest.mark.replayable]
 
 def test_free_text_relevance(session):
     search_endpoint = "/find"
@@ -1,5 +1,7 @@
 from conf_util import *
+import bench_util
 import json
+import time
 
 pytestmark = pytest.mark.dev
 
@@ -18,14 +20,21 @@ def test_get_urls(session):
         f"{ID_URL}/vocab/",
     ]
 
-    for url in urls:
-        for content_type in HTML_CONTENT_TYPES:
-            result = session.get(url, headers={"accept": content_type})
+    def check(case):
+        url, content_type = case
+        start = time.monotonic()
+        result = session.get(url, headers={"accept": content_type})
+        elapsed = time.monotonic() - start
+        if content_type in HTML_CONTENT_TYPES:
             _check_html_response(result, url)
-
-        for content_type in NON_HTML_CONTENT_TYPES:
-            result = session.get(url, headers={"accept": content_type})
+        else:
             _check_nonhtml_response(result, content_type, url)
+        return elapsed
+
+    cases = [(url, content_type)
+             for url in urls
+             for content_type in HTML_CONTENT_TYPES + NON_HTML_CONTENT_TYPES]
+    _check_all(check, cases, "id.kb.se content negotiation")
 
 
 def test_get_data_urls(session):
@@ -34,10 +43,18 @@ def test_get_data_urls(session):
         f"{ID_URL}/vocab/display",
     ]
 
-    for url in urls:
-        for content_type, extension in FILE_TYPES.items():
-            result = session.get(f"{url}/data.{extension}")
-            _check_nonhtml_response(result, content_type, url)
+    def check(case):
+        url, content_type = case
+        start = time.monotonic()
+        result = session.get(f"{url}/data.{FILE_TYPES[content_type]}")
+        elapsed = time.monotonic() - start
+        _check_nonhtml_response(result, content_type, url)
+        return elapsed
+
+    cases = [(url, content_type)
+             for url in urls
+             for content_type in FILE_TYPES]
+    _check_all(check, cases, "id.kb.se data.<ext>")
 
 
 def test_context(session):
@@ -52,6 +69,27 @@ def test_context(session):
     assert json.loads(result.content), context_url
 
 
+def _check_all(check, cases, title):
+    # Runs check for every (url, content type) concurrently, then reports
+    # all failures and the latency per serialization. check returns the
+    # time taken by the request.
+    results = run_concurrently(check, cases, return_exceptions=True)
+
+    timings = {}
+    failures = []
+    for (url, content_type), result in zip(cases, results):
+        if isinstance(result, Exception):
+            failures.append(f"{url} [{content_type}]: {result!r}")
+        else:
+            timings.setdefault(content_type, []).append(result)
+
+    bench_util.add_report(f"{title} latency per serialization",
+                          ["content type", "count", "p50 ms", "p95 ms", "max ms"],
+                          [(content_type, *bench_util.latency_stats(t))
+                           for content_type, t in sorted(timings.items())])
+    assert not failures, "\n".join(failures)
+
+
 def _check_html_response(result, url):
     assert result.status_code == 200, url
     assert "text/html" in result.headers["content-type"]
@@ -0,0 +1,48 @@
+from json_stream import JsonWalker, WILDCARD
+import json
+import pytest
+
+
+def _chunked(text, size):
+    data = text.encode('utf-8')
+    return [data[i:i + size] for i in range(0, len(data), size)]
+
+
+@pytest.mark.parametrize('chunks, expected', [
+    ([b'{"a": 2.', b'5}'], 2.5),
+    ([b'{"a": 25e', b'3}'], 25e3),
+    ([b'{"a": 2.5e', b'3}'], 2.5e3),
+    ([b'{"a": 2.5e', b'-3}'], 2.5e-3),
+    ([b'{"a": 2.5e-', b'3}'], 2.5e-3),
+    ([b'{"a": -', b'12}'], -12),
+    ([b'{"a": 1', b'2}'], 12),
+    ([b'{"a": 12', b'}'], 12),
+])
+def test_number_split_between_chunks(chunks, expected):
+    assert list(JsonWalker(chunks).walk(('a',))) == [(('a',), expected)]
+
+
+@pytest.mark.parametrize('size', [1, 2, 3, 7, 64, 65536])
+def test_walk_in_chunks(size):
+    document = {'totalItems': 1234567,
+                'items': [{'@id': 'x{}'.format(i), 'title': 'åäö☃' * i,
+                           'numbers': [1.5e10, -3, 0.25, -2.5e-3, None, True]}
+                          for i in range(30)],
+                'stats': {'sliceByDimension': {
+                    'a': {'observation': [{'totalItems': i} for i in range(5)]},
+                    'b': {'observation': []}}},
+                'empty': {}}
+    for indent in (None, 2):
+        chunks = _chunked(json.dumps(document, indent=indent, ensure_ascii=False), size)
+
+        walker = JsonWalker(chunks)
+        values = list(walker.walk(('totalItems',), ('items', WILDCARD),
+                                  ('stats', 'sliceByDimension', WILDCARD,
+                                   'observation', WILDCARD)))
+        assert values[0] == (('totalItems',), 1234567)
+        assert [value for path, value in values if path[0] == 'items'] == document['items']
+        assert [path for path, _ in values if path[0] == 'stats'] == \
+            [('stats', 'sliceByDimension', 'a', 'observation', i) for i in range(5)]
+        assert walker.bytes_read == sum(len(chunk) for chunk in chunks)
+
+        assert list(JsonWalker(chunks).walk(())) == [((), document)]
@@ -1,75 +1,108 @@
 from conf_util import *
+from oai_util import OAI_NS, harvest
+import bench_util
 import os
-import requests
 from datetime import datetime, timedelta
 
 pytestmark = pytest.mark.dev
 
 OAIPMH_URL = os.environ.get('LXLTESTING_OAIPMH_URL')
+# Pages to harvest per format, 0 for the full set
+OAIPMH_HARVEST_PAGES = int(os.environ.get('LXLTESTING_OAIPMH_HARVEST_PAGES', 3))
 
 
-def test_get_record(session, load_holding):
+def test_get_record(anonymous_session, session, load_holding):
     holding_id = load_holding(session)
-    result = requests.session().get(OAIPMH_URL +
-                                    '?verb=GetRecord&metadataPrefix=oai_dc&identifier=' +
-                                    holding_id)
+    result = anonymous_session.get(OAIPMH_URL +
+                                   '?verb=GetRecord&metadataPrefix=oai_dc&identifier=' +
+                                   holding_id)
 
     assert result.status_code == 200
     assert '<identifier>{}</identifier>'.format(holding_id) in result.text
 
 
-def test_holding_for_sigel_is_exported_on_bib_datestamp_updated(session, load_holding, load_bib_for_module):
+def test_holding_for_sigel_is_exported_on_bib_datestamp_updated(anonymous_session, session, load_holding, load_bib_for_module):
     bib_id = load_bib_for_module()
     holding_id = load_holding(session, item_of=bib_id)
 
     from_time = (datetime.utcnow() - timedelta(minutes=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
     until_time = (datetime.utcnow() + timedelta(minutes=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
 
-    result = requests.session().get(OAIPMH_URL +
-                                    '?metadataPrefix=marcxml_expanded&set=hold:{}&verb=ListRecords&from={}&until={}'.format(
-                                        '%s' % ACTIVE_SIGEL, from_time, until_time))
+    result = anonymous_session.get(OAIPMH_URL +
+                                   '?metadataPrefix=marcxml_expanded&set=hold:{}&verb=ListRecords&from={}&until={}'.format(
+                                       '%s' % ACTIVE_SIGEL, from_time, until_time))
 
     assert '<identifier>{}</identifier>'.format(holding_id) in result.text
     assert '<setSpec>hold</setSpec>' in result.text
 
 
 @pytest.mark.skip(reason="broken on DEV")
-def test_bib_expanded_includes_auth_information(session):
+def test_bib_expanded_includes_auth_information(anonymous_session):
     bibexample = ITEM_OF_DEFAULT
     bibexample_auth_record_id = 'wt79bh6f2j46dtr'
 
-    result = requests.session().get(OAIPMH_URL +
-                                    '?verb=GetRecord&metadataPrefix=marcxml&identifier={}'.format(bibexample))
+    result = anonymous_session.get(OAIPMH_URL +
+                                   '?verb=GetRecord&metadataPrefix=marcxml&identifier={}'.format(bibexample))
 
     assert bibexample_auth_record_id not in result.text
 
-    result = requests.session().get(OAIPMH_URL +
-                                    '?verb=GetRecord&metadataPrefix=marcxml_expanded&identifier={}'.format(bibexample))
+    result = anonymous_session.get(OAIPMH_URL +
+                                   '?verb=GetRecord&metadataPrefix=marcxml_expanded&identifier={}'.format(bibexample))
 
     assert bibexample_auth_record_id in result.text
 
 
-def test_bib_includehold_includes_holdings(session, load_holding):
+def test_bib_includehold_includes_holdings(anonymous_session, session, load_holding):
     bibexample = ITEM_OF_DEFAULT
     holding_id = load_holding(session, item_of=ITEM_OF_DEFAULT)
 
-    result = requests.session().get(OAIPMH_URL +
-                                    '?verb=GetRecord&metadataPrefix=marcxml_includehold&identifier={}'.format(bibexample))
+    result = anonymous_session.get(OAIPMH_URL +
+                                   '?verb=GetRecord&metadataPrefix=marcxml_includehold&identifier={}'.format(bibexample))
 
     short_hold_id = holding_id.rsplit('/', 1)[0]
     assert short_hold_id in result.text
 
 
-def test_identify_should_contain_repository_name(session):
-    result = requests.session().get(OAIPMH_URL + '?verb=Identify')
+def test_identify_should_contain_repository_name(anonymous_session):
+    result = anonymous_session.get(OAIPMH_URL + '?verb=Identify')
     assert 'Libris XL' in result.text
 
 
-def test_sets_should_contain_example_set_specifications(session):
-    result = requests.session().get(OAIPMH_URL + '?verb=ListSets')
+def test_sets_should_contain_example_set_specifications(anonymous_session):
+    result = anonymous_session.get(OAIPMH_URL + '?verb=ListSets')
     assert '<setSpec>auth</setSpec>' in result.text
     assert '<setSpec>bib</setSpec>' in result.text
     assert '<setSpec>hold</setSpec>' in result.text
     assert '<setSpec>hold:S</setSpec>' in result.text
     assert '<setSpec>hold:KVIN</setSpec>' in result.text
     assert '<setSpec>hold:Gbg</setSpec>' in result.text
+
+
+@pytest.mark.bench
+@pytest.mark.parametrize('metadata_prefix', ['oai_dc', 'marcxml',
+                                             'marcxml_expanded',
+                                             'marcxml_includehold'])
+def test_harvest_list_records(anonymous_session, metadata_prefix):
+    identifiers = set()
+
+    def check_record(record):
+        identifier = record.findtext('{0}header/{0}identifier'.format(OAI_NS))
+        assert identifier
+        identifiers.add(identifier)
+
+    stats = harvest(anonymous_session, OAIPMH_URL, metadata_prefix,
+                    max_pages=OAIPMH_HARVEST_PAGES, on_record=check_record)
+
+    assert stats['records'] > 0
+
+    latencies = [page['seconds'] for page in stats['pages']]
+    bench_util.report_row(
+        'oai-pmh harvest',
+        ['metadataPrefix', 'pages', 'records', 'repeated', 'records/s', 'kB/s',
+         'page p50 ms', 'page p95 ms', 'page max ms'],
+        # Records changed during the harvest are listed again on a later
+        # page, so repeats are reported rather than failed on
+        [metadata_prefix, len(stats['pages']), stats['records'],
+         stats['records'] - len(identifiers),
+         stats['records_per_second'], stats['bytes_per_second'] / 1000,
+         *bench_util.latency_stats(latencies)[1:]])
@@ -1,7 +1,6 @@
 from time import sleep
 
 from conf_util import *
-import re
 
 pytestmark = pytest.mark.dev
 
@@ -379,25 +378,6 @@ def test_get_with_lens(session, view, lens):
     assert check_lens(json) == lens
 
 
-cached_ids = {}
-def find_id(session, q):
-    if q in cached_ids:
-        return cached_ids[q]
-
-    url = ROOT_URL + '/find?q=' + q
-
-    result = session.get(url)
-    assert result.status_code == 200
-    json = result.json()
-    assert len(json['items']) == 1
-
-    the_id = json['items'][0]['@id']
-    the_id = re.sub('#.*', '', the_id)
-    cached_ids[q] = the_id
-
-    return the_id
-
-
 def test_search(session):
     search_endpoint = "/find"
     limit = 1
@@ -738,10 +718,11 @@ def test_search_indexing(session):
 def test_search_date(session, load_bib):
     import datetime
 
-    def create(generationDate, pubYear, edition):
-        load_bib(resource('bib_date.jsonld'), {'_:TMP_DATE': generationDate,
-                                               '_:TMP_EDITION': edition,
-                                               '_:TMP_YEAR': pubYear})
+    def spec(generationDate, pubYear, edition):
+        return {'bib_file': resource('bib_date.jsonld'),
+                'replacements': {'_:TMP_DATE': generationDate,
+                                 '_:TMP_EDITION': edition,
+                                 '_:TMP_YEAR': pubYear}}
 
     def search(params):
         query_params = {'hasTitle.mainTitle': 'DATE_TEST_TITLE',
@@ -753,10 +734,10 @@ def test_search_date(session, load_bib):
 
     # Given
     # meta.generationDate, publication.year, editionStatement
-    create('1983-12-07T11:12:00Z', '1968', 'A') # W49
-    create('1990-01-02T10:10:10Z', '1971', 'B') # W01
-    create('1992-01-02T10:10:10Z', '1975', 'C') # W01
-    create('1995-10-10T09:09:09Z', '1980', 'D') # W41
+    load_bib.many([spec('1983-12-07T11:12:00Z', '1968', 'A'), # W49
+                   spec('1990-01-02T10:10:10Z', '1971', 'B'), # W01
+                   spec('1992-01-02T10:10:10Z', '1975', 'C'), # W01
+                   spec('1995-10-10T09:09:09Z', '1980', 'D')]) # W41
     trigger_elastic_refresh(session)
 
     # Then:
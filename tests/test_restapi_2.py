@@ -1,11 +1,12 @@
 from conf_util import *
 
-pytestmark = pytest.mark.dev
+pytestmark = [pytest.mark.dev, pytest.mark.replayable]
 
 TYPE_WORK_FILTER={'filter': '"rdf:type":Work'}
 DEFAULT_WORK_FILTER = {'defaultSiteFilters': [TYPE_WORK_FILTER]}
 FIND_API = ROOT_URL + "/find"
 
+@pytest.mark.latency(p95_ms=1000, repeat=20)
 def test_default_work_filter(session):
     query_params = {'_q': '', '_appConfig': json.dumps(DEFAULT_WORK_FILTER)}
 
@@ -386,6 +387,7 @@ def test_get_search_mappings(session):
     assert default_site_filter_mapping['property']['@id'] == 'http://www.w3.org/1999/02/22-rdf-syntax-ns#type'
     assert default_site_filter_mapping['equals']['@id'] == 'https://id.kb.se/vocab/Work'
 
+@pytest.mark.latency(p95_ms=4000, repeat=10)
 def test_get_stats(session):
     for type in ['Instance', 'Work']:
         statistics = {
@@ -470,4 +472,3 @@ def test_get_stats(session):
 
         monograph = find_observation(sbd, 'librissearch:workType', 'https://id.kb.se/vocab/Monograph')
         assert_observation(monograph, 10000)
-